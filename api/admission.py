@@ -0,0 +1,113 @@
+"""Admission control for job submissions.
+
+Two checks run before a job is sent to jobqueue:
+
+- Rate: every client (``X-Client-Id`` header, else its address) has a
+  token bucket refilled at ``client_rate`` jobs per second up to
+  ``client_burst``. Normal jobs may not take the last ``protected_share`` of
+  the bucket, which stays available to protected jobs.
+- Backlog: the active messages on jobqueue and every worker queue, read
+  from the API's cached queue snapshot (so admission never waits on the
+  broker) plus the jobs this replica admitted since that snapshot. Normal
+  jobs are turned away once the backlog reaches ``max_backlog``; protected
+  jobs once it reaches ``max_backlog`` times ``1 + protected_headroom``.
+
+Protected jobs are the high-priority and ``latency_sensitive`` ones. A
+rejected submission gets the number of seconds to wait before retrying.
+State is per API replica, so the effective client rate scales with the
+replica count. A missing or stale snapshot admits everything: the broker
+being slow to report must not stop intake.
+"""
+import collections
+import math
+import threading
+import time
+
+RATE_LIMITED = "rate_limited"
+OVERLOADED = "overloaded"
+
+
+def is_protected(payload: dict) -> bool:
+    return payload.get("priority") == "high" or bool(payload.get("latency_sensitive"))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def take(self, now: float, floor: float = 0.0) -> float:
+        """Take one token if that leaves at least ``floor``; else the seconds until it would"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens - 1 >= floor:
+            self.tokens -= 1
+            return 0.0
+        return (floor + 1 - self.tokens) / self.rate
+
+
+class Admission:
+    """Decides whether to accept a job; ``admit`` returns None or (reason, retry_after_sec)"""
+
+    def __init__(self, monitor, queues: list, max_backlog: int = 0, protected_headroom: float = 0.5,
+                 client_rate: float = 0, client_burst: float = 0, protected_share: float = 0.2,
+                 retry_after: float = 5, max_clients: int = 10000):
+        self.monitor = monitor
+        self.queues = list(queues)
+        self.max_backlog = max_backlog
+        self.protected_headroom = protected_headroom
+        self.client_rate = client_rate
+        self.client_burst = client_burst or max(1.0, client_rate)
+        self.protected_share = protected_share
+        self.retry_after = retry_after
+        self.max_clients = max_clients
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._backlog = None
+        self._backlog_at = None
+        self._admitted = 0
+
+    def backlog(self):
+        """Active messages across the watched queues, None without a fresh snapshot"""
+        monitor = self.monitor
+        if monitor is None or monitor.updated_at is None or monitor.age() > monitor.stale_after:
+            return None
+        with self._lock:
+            # Summed once per snapshot rather than per request
+            if self._backlog_at != monitor.updated_at:
+                snapshot = monitor.value
+                self._backlog = sum((snapshot.get(queue) or {}).get("active") or 0 for queue in self.queues)
+                self._backlog_at = monitor.updated_at
+                self._admitted = 0
+            return self._backlog + self._admitted
+
+    def _check_rate(self, client: str, protected: bool, now: float) -> float:
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.client_rate, self.client_burst, now)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            # The reserve never takes a normal job's last token away when the burst is tiny
+            floor = 0.0 if protected else min(self.client_burst * self.protected_share, self.client_burst - 1)
+            return bucket.take(now, floor)
+
+    def admit(self, client: str, payload: dict, now: float = None):
+        now = now or time.time()
+        protected = is_protected(payload)
+        if self.max_backlog > 0:
+            backlog = self.backlog()
+            limit = self.max_backlog * (1 + self.protected_headroom) if protected else self.max_backlog
+            if backlog is not None and backlog >= limit:
+                return OVERLOADED, max(1, math.ceil(self.retry_after))
+        if self.client_rate > 0:
+            wait = self._check_rate(client, protected, now)
+            if wait > 0:
+                return RATE_LIMITED, max(1, math.ceil(wait))
+        with self._lock:
+            self._admitted += 1
+        return None
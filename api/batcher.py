@@ -0,0 +1,90 @@
+import asyncio
+
+
+class JobBatcher:
+    """Coalesces concurrent submissions into one broker batch per flush.
+
+    Handlers await ``submit()``; a background task collects pending bodies
+    until ``max_batch_size`` is reached or ``max_delay_ms`` has passed since
+    the first one arrived, sends them with a single ``send_batch`` call and
+    resolves every waiting future with the outcome of that send.
+    """
+
+    def __init__(self, send_batch, max_batch_size: int = 100, max_delay_ms: float = 5, max_in_flight: int = 4):
+        self.send_batch = send_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.max_in_flight = max_in_flight
+        self._queue = None
+        self._task = None
+        self._flushes = set()
+        self._collecting = []
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # Anything still buffered goes out in one last flush
+        pending, self._collecting = self._collecting, []
+        while self._queue and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        if pending:
+            await self._in_flight.acquire()
+            await self._flush(pending)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def submit(self, body):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((body, future))
+        await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        # Kept on self until handed off so stop() can still flush it
+        items = self._collecting = [await self._queue.get()]
+        deadline = loop.time() + self.max_delay
+        while len(items) < self.max_batch_size:
+            if not self._queue.empty():
+                items.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            # Bound concurrent flushes to the number of senders available
+            await self._in_flight.acquire()
+            flush = asyncio.create_task(self._flush(items))
+            self._collecting = []
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, items: list):
+        try:
+            await asyncio.to_thread(self.send_batch, [body for body, _ in items])
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for _, future in items:
+                if not future.done():
+                    future.set_result(None)
+        finally:
+            self._in_flight.release()
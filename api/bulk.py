@@ -0,0 +1,130 @@
+import codecs
+import json
+
+MAX_ITEM_BYTES = 1_000_000
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+async def _text_chunks(byte_chunks):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in byte_chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def _iter_ndjson(text_chunks, buffer: str):
+    index = 0
+    ended = False
+    while True:
+        newline = buffer.find("\n")
+        if newline == -1 and not ended:
+            if len(buffer) > MAX_ITEM_BYTES:
+                yield index, None, "item too large"
+                return
+            try:
+                buffer += await text_chunks.__anext__()
+            except StopAsyncIteration:
+                ended = True
+            continue
+        if newline == -1:
+            line, buffer = buffer, ""
+        else:
+            line, buffer = buffer[:newline], buffer[newline + 1:]
+        line = line.strip()
+        if line:
+            try:
+                yield index, json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield index, None, f"invalid JSON: {e.msg}"
+            index += 1
+        if ended and not buffer:
+            return
+
+
+async def _iter_array(text_chunks, buffer: str):
+    index = 0
+    pos = 1  # skip the opening bracket
+    ended = False
+
+    async def more():
+        nonlocal buffer, pos, ended
+        # Drop everything already consumed so the buffer only holds one item
+        buffer = buffer[pos:]
+        pos = 0
+        try:
+            buffer += await text_chunks.__anext__()
+        except StopAsyncIteration:
+            ended = True
+
+    # What may come next: the first element or "]", an element after a comma, or a separator
+    expecting = "first"
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos >= len(buffer):
+            if ended:
+                yield index, None, "unterminated JSON array"
+                return
+            await more()
+            continue
+        char = buffer[pos]
+        if expecting == "separator":
+            if char == "]":
+                return
+            if char != ",":
+                yield index, None, "invalid JSON: expected ',' or ']' after an array element"
+                return
+            pos += 1
+            expecting = "element"
+            continue
+        if char == "]" and expecting == "first":
+            return
+        if char in ",]":
+            yield index, None, "invalid JSON: expected an array element"
+            return
+        try:
+            item, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if not ended and len(buffer) - pos <= MAX_ITEM_BYTES:
+                await more()
+                continue
+            # Cannot resynchronise inside a broken array, so stop here
+            yield index, None, f"invalid JSON: {e.msg}"
+            return
+        if end == len(buffer) and not ended:
+            # A scalar cut at a chunk boundary still decodes; wait for its delimiter
+            await more()
+            continue
+        yield index, item, None
+        index += 1
+        pos = end
+        expecting = "separator"
+
+
+async def iter_json_items(byte_chunks, ndjson: bool = False):
+    """Yield (index, item, error) from a JSON array or NDJSON byte stream.
+
+    Items are decoded one at a time as chunks arrive, so only the current
+    item is ever held in memory. Malformed NDJSON lines are reported and
+    skipped; a malformed array element ends the stream.
+    """
+    text_chunks = _text_chunks(byte_chunks).__aiter__()
+    buffer = ""
+    while not buffer.strip():
+        try:
+            buffer += await text_chunks.__anext__()
+        except StopAsyncIteration:
+            return
+    buffer = buffer.lstrip()
+    if buffer[0] == "[" and not ndjson:
+        items = _iter_array(text_chunks, buffer)
+    else:
+        items = _iter_ndjson(text_chunks, buffer)
+    async for result in items:
+        yield result
@@ -0,0 +1,110 @@
+"""Current state of every job, built from job-status events.
+
+Events are merged with ``merge()``: a job's state only moves forward
+(``job_status.STATE_RANK``, newest wins on a tie), and every state keeps
+its own timestamp, so out-of-order or repeated events are harmless.
+Writes are applied in batches.
+"""
+import collections
+import json
+import os
+import sqlite3
+import threading
+from job_status import STATE_RANK
+
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "sqlite")
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.db")
+JOB_STORE_MAX_ENTRIES = int(os.getenv("JOB_STORE_MAX_ENTRIES", "100000"))
+
+FIELDS = ("platform", "target", "worker", "duration", "error")
+
+
+def merge(record: dict, event: dict) -> dict:
+    """Fold one event into a job record (None for a job not seen before)"""
+    record = dict(record) if record else {"job_id": event["job_id"], "state": None, "updated_at": 0}
+    state, at = event["state"], event["at"]
+    record[f"{state}_at"] = at
+    current = STATE_RANK.get(record["state"], -1)
+    rank = STATE_RANK.get(state, -1)
+    if rank > current or (rank == current and at >= record["updated_at"]):
+        record["state"] = state
+        record["updated_at"] = at
+        if state not in ("failed", "quarantined"):
+            record.pop("error", None)
+    for field in FIELDS:
+        if field in event:
+            record[field] = event[field]
+    return record
+
+
+class MemoryJobStore:
+    """Bounded in-process store; the least recently updated jobs are dropped first"""
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def apply(self, events: list):
+        with self._lock:
+            for event in events:
+                self._jobs[event["job_id"]] = merge(self._jobs.get(event["job_id"]), event)
+                self._jobs.move_to_end(event["job_id"])
+            while len(self._jobs) > self.max_entries:
+                self._jobs.popitem(last=False)
+
+    def get(self, job_id: str):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record else None
+
+    def close(self):
+        pass
+
+
+class SQLiteJobStore:
+    """Embedded SQLite store; each batch of events is one transaction"""
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, record TEXT NOT NULL)")
+        self._lock = threading.Lock()
+
+    def apply(self, events: list):
+        with self._lock:
+            ids = list(dict.fromkeys(event["job_id"] for event in events))
+            records = {}
+            # Read the affected rows in chunks below SQLite's bound-parameter limit
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT job_id, record FROM jobs WHERE job_id IN ({','.join('?' * len(chunk))})", chunk
+                )
+                records.update((job_id, json.loads(record)) for job_id, record in rows)
+            for event in events:
+                records[event["job_id"]] = merge(records.get(event["job_id"]), event)
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO jobs (job_id, record) VALUES (?, ?)",
+                    [(job_id, json.dumps(records[job_id])) for job_id in ids]
+                )
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self.connection.execute("SELECT record FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+def create_job_store(backend: str = None):
+    backend = backend or JOB_STORE_BACKEND
+    if backend == "sqlite":
+        return SQLiteJobStore(JOB_STORE_PATH)
+    if backend == "memory":
+        return MemoryJobStore(JOB_STORE_MAX_ENTRIES)
+    raise ValueError(f"Unknown job store backend: {backend}")
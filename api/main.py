@@ -1,32 +1,62 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 from typing import Optional
-from azure.servicebus import ServiceBusClient, ServiceBusMessage
-from opencensus.ext.azure.log_exporter import AzureLogHandler
 from opencensus.ext.azure import metrics_exporter
 from opencensus.stats import aggregation as aggregation_module
 from opencensus.stats import measure as measure_module
 from opencensus.stats import stats as stats_module
 from opencensus.stats import view as view_module
 from opencensus.tags import tag_map as tag_map_module
+from transport import Message, connect_with_retry
+from dedup import CLAIMED, DONE, create_dedup_store
+from job_status import SUBMITTED, status_event
+from job_store import create_job_store
+from status import StatusTracker
+from queue_monitor import QueueStatusMonitor
+from batcher import JobBatcher
+from admission import RATE_LIMITED, Admission
+from bulk import iter_json_items
+from priority import lane_queues
+from tracing import TRACE_ID, new_trace
+from telemetry import Telemetry
+from envelope import encode_job, payload_store
+from retry import dead_letter_info, requeue
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from metrics import LATENCY_BUCKETS
+import asyncio
 import json
 import uuid
 import os
 import time
-import logging
 
 app = FastAPI()
 
 # Azure Application Insights configuration
 APPINSIGHTS_CONNECTION_STRING = os.getenv("APPINSIGHTS_CONNECTION_STRING")
-SERVICEBUS_CONNECTION_STRING = os.getenv("SERVICEBUS_CONNECTION_STRING")
+SENDER_POOL_SIZE = int(os.getenv("SENDER_POOL_SIZE", "4"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "100"))
+INGEST_BATCH_WINDOW_MS = float(os.getenv("INGEST_BATCH_WINDOW_MS", "5"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+STATUS_BATCH_SIZE = int(os.getenv("STATUS_BATCH_SIZE", "500"))
+JOB_WAIT_MAX_SEC = float(os.getenv("JOB_WAIT_MAX_SEC", "60"))
+QUEUE_STATUS_INTERVAL = float(os.getenv("QUEUE_STATUS_INTERVAL", "5"))
+
+# Admission control (0 disables each check): backlog limit across jobqueue and the worker queues,
+# with extra headroom for high-priority/latency-sensitive jobs, and per-client token buckets
+ADMISSION_MAX_BACKLOG = int(os.getenv("ADMISSION_MAX_BACKLOG", "0"))
+ADMISSION_PROTECTED_HEADROOM = float(os.getenv("ADMISSION_PROTECTED_HEADROOM", "0.5"))
+ADMISSION_CLIENT_RATE = float(os.getenv("ADMISSION_CLIENT_RATE", "0"))
+ADMISSION_CLIENT_BURST = float(os.getenv("ADMISSION_CLIENT_BURST", "0"))
+ADMISSION_PROTECTED_SHARE = float(os.getenv("ADMISSION_PROTECTED_SHARE", "0.2"))
+ADMISSION_RETRY_AFTER_SEC = float(os.getenv("ADMISSION_RETRY_AFTER_SEC", str(2 * QUEUE_STATUS_INTERVAL)))
+
+# Logs are exported to stdout and Application Insights from a background thread;
+# per-job lines are sampled (JOB_LOG_SAMPLE_RATE)
+telemetry = Telemetry("API", APPINSIGHTS_CONNECTION_STRING)
+logger = telemetry.logger
 
-# Setup logging with Application Insights
-logger = logging.getLogger(__name__)
 if APPINSIGHTS_CONNECTION_STRING:
-    logger.addHandler(AzureLogHandler(connection_string=APPINSIGHTS_CONNECTION_STRING))
-    logger.setLevel(logging.INFO)
-    
     # Setup custom metrics
     stats = stats_module.stats
     view_manager = stats.view_manager
@@ -46,6 +76,16 @@ if APPINSIGHTS_CONNECTION_STRING:
     
     mmap = stats.stats_recorder.new_measurement_map()
 
+# Prometheus metrics, served on /metrics
+api_requests = Counter('api_requests_total', 'HTTP requests handled', ['method', 'route', 'status'])
+api_request_duration = Histogram('api_request_duration_seconds', 'HTTP request latency', ['method', 'route'],
+                                 buckets=LATENCY_BUCKETS)
+api_jobs_submitted = Counter('api_jobs_submitted_total', 'Jobs accepted and sent to jobqueue', ['endpoint'])
+api_jobs_duplicate = Counter('api_jobs_duplicate_total', 'Submissions answered from an earlier Idempotency-Key')
+api_jobs_rejected = Counter('api_jobs_rejected_total', 'Submissions rejected or not sent', ['reason'])
+api_dead_letters_requeued = Counter('api_dead_letters_requeued_total', 'Dead-lettered messages sent back to their queue',
+                                    ['queue'])
+
 class JobPayload(BaseModel):
     rows: Optional[int] = 1000
     estimated_runtime_sec: Optional[int] = 10
@@ -53,10 +93,158 @@ class JobPayload(BaseModel):
     latency_sensitive: Optional[bool] = False
     data: Optional[dict] = {}
 
+class RequeueRequest(BaseModel):
+    job_ids: Optional[list] = None  # every dead-lettered message when omitted
+    limit: int = Field(100, ge=1)
+
+# Broker shared by all requests; senders are opened at startup instead of per request
+broker = None
+
+# Requests repeating an Idempotency-Key get the job id of the first one
+dedup = create_dedup_store()
+IDEMPOTENCY_NAMESPACE = uuid.UUID("8f6c1d0e-5b7a-4f0e-9a43-2d1c6e7b9f10")
+
+def new_job_id(idempotency_key: str = None) -> str:
+    """Random id, or one derived from the key so every API replica maps a key to the same job"""
+    if idempotency_key:
+        return str(uuid.uuid5(IDEMPOTENCY_NAMESPACE, idempotency_key))
+    return str(uuid.uuid4())
+
+def claim_submission(job_id: str) -> str:
+    """Claim an idempotent submission: CLAIMED, DONE for a repeat, anything else while one is in progress"""
+    return dedup.claim(f"submit:{job_id}")
+
+def settle_submission(job_id: str, sent: bool):
+    """Remember a sent submission, or free its claim so a retry can send it"""
+    if sent:
+        dedup.complete(f"submit:{job_id}")
+    else:
+        dedup.release(f"submit:{job_id}")
+
+def job_message(job: dict) -> Message:
+    """Message for jobqueue, carrying a new trace stamped with the submission time"""
+    body, properties = encode_job(job, payload_store())
+    # The job id doubles as the message id, so brokers with duplicate detection drop resends
+    return Message(body, properties={**properties, **new_trace()}, message_id=job["job_id"])
+
+async def build_message(job: dict) -> Message:
+    """``job_message`` off the event loop when its data may be uploaded to the payload store"""
+    if payload_store() is not None and job["payload"].get("data"):
+        return await asyncio.to_thread(job_message, job)
+    return job_message(job)
+
+# Job states, fed by this API's submissions and the job-status queue
+job_store = create_job_store()
+status_tracker = None
+
+# /queues/status is served from this snapshot, refreshed in the background
+STATUS_QUEUES = ["jobqueue"] + [
+    queue for base in ["actor-jobs", "spark-jobs", "ml-jobs", "batch-jobs"] for queue in lane_queues(base)
+]
+queue_status_monitor = None
+
+# Dead-letter reads and requeues take one queue at a time, off the event loop, capped per request
+dead_letters_lock = asyncio.Lock()
+DEAD_LETTER_MAX_BATCH = 500
+
+# Reads the same snapshot; the monitor is attached at startup
+admission = Admission(
+    None,
+    STATUS_QUEUES,
+    max_backlog=ADMISSION_MAX_BACKLOG,
+    protected_headroom=ADMISSION_PROTECTED_HEADROOM,
+    client_rate=ADMISSION_CLIENT_RATE,
+    client_burst=ADMISSION_CLIENT_BURST,
+    protected_share=ADMISSION_PROTECTED_SHARE,
+    retry_after=ADMISSION_RETRY_AFTER_SEC
+)
+
+def client_id(request: Request) -> str:
+    """Who a submission is rate-limited as: the X-Client-Id header, else the caller's address"""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+def send_jobs(msgs: list):
+    broker.send_batch("jobqueue", msgs)
+    for msg in msgs:
+        status_tracker.record(status_event(msg.message_id, SUBMITTED))
+
+# Submissions are buffered and flushed to jobqueue as one message batch
+job_batcher = JobBatcher(
+    send_jobs,
+    max_batch_size=INGEST_BATCH_SIZE,
+    max_delay_ms=INGEST_BATCH_WINDOW_MS,
+    max_in_flight=SENDER_POOL_SIZE
+)
+
+@app.on_event("startup")
+async def start_ingestion():
+    global broker, status_tracker, queue_status_monitor
+    broker = await asyncio.to_thread(connect_with_retry, "API", senders_per_queue=SENDER_POOL_SIZE)
+    await asyncio.to_thread(broker.warm, "jobqueue")
+    status_tracker = StatusTracker(job_store, broker, batch_size=STATUS_BATCH_SIZE)
+    status_tracker.start(asyncio.get_running_loop())
+    queue_status_monitor = QueueStatusMonitor(
+        lambda: connect_with_retry("API"), STATUS_QUEUES, interval=QUEUE_STATUS_INTERVAL, name="API")
+    queue_status_monitor.start()
+    admission.monitor = queue_status_monitor
+    job_batcher.start()
+
+@app.on_event("shutdown")
+async def stop_ingestion():
+    await job_batcher.stop()
+    queue_status_monitor.stop()
+    status_tracker.stop()
+    job_store.close()
+    telemetry.close()
+    broker.close()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template, not the raw path, so /jobs/{job_id} stays one series
+        route = request.scope.get("route")
+        route = route.path if route is not None else "unmatched"
+        api_request_duration.labels(method=request.method, route=route).observe(time.perf_counter() - start_time)
+        api_requests.labels(method=request.method, route=route, status=str(status)).inc()
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/submit-job")
-def submit_job(payload: JobPayload):
+async def submit_job(payload: JobPayload, request: Request, idempotency_key: Optional[str] = Header(None)):
     start_time = time.time()
-    job_id = str(uuid.uuid4())
+    job_id = new_job_id(idempotency_key)
+    
+    if idempotency_key:
+        state = claim_submission(job_id)
+        if state == DONE:
+            api_jobs_duplicate.inc()
+            return {
+                "status": "submitted",
+                "job_id": job_id,
+                "duplicate": True
+            }
+        if state != CLAIMED:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+    
+    rejection = admission.admit(client_id(request), payload.dict())
+    if rejection is not None:
+        reason, retry_after = rejection
+        if idempotency_key:
+            settle_submission(job_id, sent=False)
+        api_jobs_rejected.labels(reason=reason).inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many jobs from this client" if reason == RATE_LIMITED else "Job backlog is full, retry later",
+            headers={"Retry-After": str(retry_after)}
+        )
     
     job = {
         "job_id": job_id,
@@ -64,68 +252,206 @@ def submit_job(payload: JobPayload):
     }
     
     try:
-        with ServiceBusClient.from_connection_string(SERVICEBUS_CONNECTION_STRING) as client:
-            sender = client.get_queue_sender(queue_name="jobqueue")
-            with sender:
-                message = ServiceBusMessage(json.dumps(job))
-                sender.send_messages(message)
+        msg = await build_message(job)
+        await job_batcher.submit(msg)
+        if idempotency_key:
+            settle_submission(job_id, sent=True)
+        api_jobs_submitted.labels(endpoint="single").inc()
         
         duration_ms = (time.time() - start_time) * 1000
         
-        # Log to Application Insights
+        telemetry.job(
+            job_id, "Job submitted: %s", job_id,
+            trace_id=msg.properties[TRACE_ID],
+            rows=payload.rows,
+            priority=payload.priority,
+            latency_sensitive=payload.latency_sensitive,
+            duration_ms=duration_ms
+        )
+        # Counts and latencies of every request are aggregated in-process and exported periodically
         if APPINSIGHTS_CONNECTION_STRING:
-            logger.info(f"Job submitted: {job_id}", extra={
-                'custom_dimensions': {
-                    'job_id': job_id,
-                    'rows': payload.rows,
-                    'priority': payload.priority,
-                    'latency_sensitive': payload.latency_sensitive,
-                    'duration_ms': duration_ms
-                }
-            })
             mmap.measure_int_put(jobs_submitted_measure, 1)
             mmap.measure_float_put(request_duration_measure, duration_ms)
             mmap.record()
         
         return {
             "status": "submitted",
-            "job_id": job_id
+            "job_id": job_id,
+            "trace_id": msg.properties[TRACE_ID]
         }
     except Exception as e:
-        if APPINSIGHTS_CONNECTION_STRING:
-            logger.error(f"Job submission failed: {str(e)}", extra={
-                'custom_dimensions': {'job_id': job_id}
-            })
+        if idempotency_key:
+            settle_submission(job_id, sent=False)
+        logger.error(f"Job submission failed: {str(e)}", extra={
+            'custom_dimensions': {'job_id': job_id}
+        })
         raise HTTPException(status_code=500, detail=str(e))
 
+async def send_bulk_chunk(chunk: list, results: list):
+    """Send (index, job_id, message, idempotent) entries and settle the claims of idempotent ones"""
+    try:
+        await asyncio.to_thread(send_jobs, [msg for _, _, msg, _ in chunk])
+    except Exception as e:
+        sent = False
+        api_jobs_rejected.labels(reason="send_failed").inc(len(chunk))
+        results.extend({"index": index, "error": str(e)} for index, _, _, _ in chunk)
+    else:
+        sent = True
+        api_jobs_submitted.labels(endpoint="bulk").inc(len(chunk))
+        results.extend({"index": index, "job_id": job_id} for index, job_id, _, _ in chunk)
+    for _, job_id, _, idempotent in chunk:
+        if idempotent:
+            settle_submission(job_id, sent)
+
+@app.post("/submit-jobs")
+async def submit_jobs(request: Request):
+    """Submit many jobs from a JSON array or an NDJSON stream"""
+    start_time = time.time()
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    client = client_id(request)
+    results = []
+    chunk = []
+
+    async for index, item, error in iter_json_items(request.stream(), ndjson=ndjson):
+        if error is None and not isinstance(item, dict):
+            error = "job must be a JSON object"
+        if error is None:
+            idempotency_key = item.pop("idempotency_key", None)
+            try:
+                payload = JobPayload(**item)
+            except ValidationError as e:
+                error = str(e)
+        if error is not None:
+            api_jobs_rejected.labels(reason="invalid").inc()
+            results.append({"index": index, "error": error})
+            continue
+
+        # Same idempotency handling as /submit-job, so a retried upload is answered from the first one
+        job_id = new_job_id(idempotency_key)
+        if idempotency_key:
+            state = claim_submission(job_id)
+            if state == DONE:
+                api_jobs_duplicate.inc()
+                results.append({"index": index, "job_id": job_id, "duplicate": True})
+                continue
+            if state != CLAIMED:
+                api_jobs_rejected.labels(reason="in_progress").inc()
+                results.append({"index": index, "error": "a request with this idempotency_key is in progress"})
+                continue
+
+        rejection = admission.admit(client, payload.dict())
+        if rejection is not None:
+            reason, retry_after = rejection
+            if idempotency_key:
+                settle_submission(job_id, sent=False)
+            api_jobs_rejected.labels(reason=reason).inc()
+            results.append({"index": index, "error": reason, "retry_after": retry_after})
+            continue
+
+        try:
+            msg = await build_message({"job_id": job_id, "payload": payload.dict()})
+        except Exception as e:
+            if idempotency_key:
+                settle_submission(job_id, sent=False)
+            api_jobs_rejected.labels(reason="send_failed").inc()
+            results.append({"index": index, "error": str(e)})
+            continue
+        chunk.append((index, job_id, msg, bool(idempotency_key)))
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await send_bulk_chunk(chunk, results)
+            chunk = []
+
+    if chunk:
+        await send_bulk_chunk(chunk, results)
+
+    results.sort(key=lambda r: r["index"])
+    submitted = sum(1 for r in results if "job_id" in r)
+    duration_ms = (time.time() - start_time) * 1000
+
+    logger.info(f"Bulk submission: {submitted}/{len(results)} jobs", extra={
+        'custom_dimensions': {
+            'submitted': submitted,
+            'failed': len(results) - submitted,
+            'duration_ms': duration_ms
+        }
+    })
+    if APPINSIGHTS_CONNECTION_STRING:
+        mmap.measure_int_put(jobs_submitted_measure, submitted)
+        mmap.measure_float_put(request_duration_measure, duration_ms)
+        mmap.record()
+
+    return {
+        "submitted": submitted,
+        "failed": len(results) - submitted,
+        "results": results
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    record = await asyncio.to_thread(job_store.get, job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return record
+
+@app.get("/jobs/{job_id}/wait")
+async def wait_for_job(job_id: str, timeout: float = 30):
+    """Long-poll: return once the job is done or quarantined, or its current state after `timeout` seconds"""
+    record = None
+    async for record in status_tracker.watch(job_id, min(timeout, JOB_WAIT_MAX_SEC)):
+        pass
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return record
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, timeout: float = JOB_WAIT_MAX_SEC):
+    """Server-sent events: one `status` event per state change until the job is done or quarantined"""
+    async def stream():
+        last = None
+        async for record in status_tracker.watch(job_id, min(timeout, JOB_WAIT_MAX_SEC)):
+            if record != last:
+                yield f"event: status\ndata: {json.dumps(record)}\n\n"
+                last = record
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
 @app.get("/health")
 def health():
     return {"status": "healthy"}
 
+def known_queue(queue_name: str) -> str:
+    if queue_name not in STATUS_QUEUES:
+        raise HTTPException(status_code=404, detail="Unknown queue")
+    return queue_name
+
+@app.get("/dead-letters/{queue_name}")
+async def dead_letters(queue_name: str, limit: int = Query(50, ge=1)):
+    """Quarantined (and otherwise dead-lettered) messages of a queue, oldest first, left in place"""
+    known_queue(queue_name)
+    async with dead_letters_lock:
+        msgs = await asyncio.to_thread(broker.peek_dead_letters, queue_name, min(limit, DEAD_LETTER_MAX_BATCH))
+    return {"queue": queue_name, "messages": [dead_letter_info(msg) for msg in msgs]}
+
+@app.post("/dead-letters/{queue_name}/requeue")
+async def requeue_dead_letters(queue_name: str, request: RequeueRequest):
+    """Send dead-lettered messages back to their queue for a fresh set of attempts"""
+    known_queue(queue_name)
+    job_ids = set(request.job_ids) if request.job_ids is not None else None
+    async with dead_letters_lock:
+        requeued = await asyncio.to_thread(
+            requeue, broker, queue_name, job_ids, min(request.limit, DEAD_LETTER_MAX_BATCH)
+        )
+    api_dead_letters_requeued.labels(queue=queue_name).inc(requeued)
+    logger.info("Requeued %d dead-lettered message(s) on %s", requeued, queue_name)
+    return {"queue": queue_name, "requeued": requeued}
+
 @app.get("/queues/status")
-def queue_status():
-    try:
-        from azure.servicebus.management import ServiceBusAdministrationClient
-        
-        admin_client = ServiceBusAdministrationClient.from_connection_string(SERVICEBUS_CONNECTION_STRING)
-        queues = ["jobqueue", "actor-jobs", "spark-jobs", "ml-jobs", "batch-jobs"]
-        status = {}
-        
-        for queue in queues:
-            try:
-                queue_props = admin_client.get_queue_runtime_properties(queue)
-                count = queue_props.total_message_count
-                status[queue] = count
-            except:
-                status[queue] = 0
-        
-        if APPINSIGHTS_CONNECTION_STRING:
-            logger.info("Queue status checked", extra={
-                'custom_dimensions': status
-            })
-        
-        return status
-    except Exception as e:
-        if APPINSIGHTS_CONNECTION_STRING:
-            logger.error(f"Queue status check failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+async def queue_status():
+    """Latest background snapshot of every queue; never calls the broker"""
+    status = queue_status_monitor.snapshot()
+    if status["stale"]:
+        logger.warning("Queue status snapshot is stale", extra={
+            'custom_dimensions': {'age_sec': status["age_sec"]}
+        })
+    return status
@@ -0,0 +1,104 @@
+"""Feeds the job store and wakes up requests waiting on a job.
+
+One background thread drains the API's own submitted events and the
+``job-status`` queue, applies everything it got in a single store write,
+then wakes the waiters of the jobs that changed. Waiting requests never
+poll the store; they sleep until their job is touched or they time out.
+"""
+import asyncio
+import collections
+import json
+import threading
+from job_status import FINAL_STATES, STATUS_QUEUE
+
+
+class StatusTracker:
+    def __init__(self, store, broker, batch_size: int = 500, poll_wait: float = 0.2):
+        self.store = store
+        self.broker = broker
+        self.batch_size = batch_size
+        self.poll_wait = poll_wait
+        self._local = collections.deque()
+        self._waiters = collections.defaultdict(set)
+        self._waiters_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._loop = None
+
+    def start(self, loop):
+        self._loop = loop
+        self._thread = threading.Thread(target=self._run, name="JOB-STATUS", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def record(self, event: dict):
+        """Queue an event produced inside the API (e.g. submitted) for the next write"""
+        self._local.append(event)
+
+    def _collect(self) -> tuple:
+        msgs = self.broker.receive_batch(STATUS_QUEUE, max_count=self.batch_size, max_wait=self.poll_wait)
+        events = []
+        while self._local:
+            events.append(self._local.popleft())
+        for msg in msgs:
+            try:
+                events.extend(json.loads(str(msg)))
+            except Exception as e:
+                print(f"[API] Ignoring malformed status message: {e}", flush=True)
+        return events, msgs
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                events, msgs = self._collect()
+                if events:
+                    self.store.apply(events)
+                    self._wake({event["job_id"] for event in events})
+                for msg in msgs:
+                    self.broker.complete(msg)
+            except Exception as e:
+                print(f"[API] Job status ingestion failed: {e}", flush=True)
+                self._stop.wait(1)
+
+    def _wake(self, job_ids: set):
+        with self._waiters_lock:
+            woken = [event for job_id in job_ids for event in self._waiters.get(job_id, ())]
+        for event in woken:
+            self._loop.call_soon_threadsafe(event.set)
+
+    async def watch(self, job_id: str, timeout: float):
+        """Yield the job's record now and after every update, until it is final or time runs out.
+
+        The waiter is registered up front and reset before each read, so an
+        update landing between the read and the wait is never missed.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        event = asyncio.Event()
+        with self._waiters_lock:
+            self._waiters[job_id].add(event)
+        try:
+            while True:
+                event.clear()
+                record = await asyncio.to_thread(self.store.get, job_id)
+                yield record
+                if record and record["state"] in FINAL_STATES:
+                    return
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return
+        finally:
+            with self._waiters_lock:
+                waiters = self._waiters.get(job_id)
+                if waiters is not None:
+                    waiters.discard(event)
+                    if not waiters:
+                        del self._waiters[job_id]
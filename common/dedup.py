@@ -0,0 +1,122 @@
+"""Duplicate suppression for redelivered and resubmitted jobs.
+
+A job id goes through ``claim`` before a component does its work on it:
+
+- ``"claimed"``: nobody has it, go ahead; then ``complete`` or ``release`` it
+- ``"in_progress"``: another attempt holds an unexpired claim, try later
+- ``"done"``: the work already happened, settle the message without redoing it
+
+The backend is picked with ``DEDUP_BACKEND``:
+
+- ``local``: a bounded in-process LRU with TTLs; catches redeliveries to the
+  same pod, which is most of them
+- ``redis``: any Redis-compatible server at ``REDIS_URL``, shared by all pods
+- ``none``: every claim succeeds
+"""
+import collections
+import os
+import threading
+import time
+
+DEDUP_BACKEND = os.getenv("DEDUP_BACKEND", "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+DEDUP_TTL_SEC = float(os.getenv("DEDUP_TTL_SEC", "86400"))
+DEDUP_CLAIM_TTL_SEC = float(os.getenv("DEDUP_CLAIM_TTL_SEC", "900"))
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "100000"))
+
+CLAIMED = "claimed"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+
+class DedupStore:
+    """Common interface; the base class never reports a duplicate"""
+
+    def claim(self, key: str) -> str:
+        return CLAIMED
+
+    def complete(self, key: str):
+        pass
+
+    def release(self, key: str):
+        pass
+
+
+class LocalDedupStore(DedupStore):
+    """LRU of recent keys; claims expire after ``claim_ttl``, done markers after ``ttl``"""
+
+    def __init__(self, max_entries: int = 100000, ttl: float = 86400, claim_ttl: float = 900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.claim_ttl = claim_ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _set(self, key: str, state: str, ttl: float):
+        self._entries[key] = (state, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def claim(self, key: str) -> str:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                return DONE if entry[0] == DONE else IN_PROGRESS
+            self._set(key, CLAIMED, self.claim_ttl)
+            return CLAIMED
+
+    def complete(self, key: str):
+        with self._lock:
+            self._set(key, DONE, self.ttl)
+
+    def release(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != DONE:
+                del self._entries[key]
+
+
+class RedisDedupStore(DedupStore):
+    """Shared store on a Redis-compatible server; the server's TTLs bound its size"""
+
+    # Delete the key only while it is still a claim, never a done marker
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str, ttl: float = 86400, claim_ttl: float = 900, prefix: str = "dedup:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.claim_ttl = int(claim_ttl)
+        self.prefix = prefix
+
+    def claim(self, key: str) -> str:
+        key = self.prefix + key
+        if self.client.set(key, CLAIMED, nx=True, ex=self.claim_ttl):
+            return CLAIMED
+        state = self.client.get(key)
+        if state is None:
+            # Expired between the two calls; try once more
+            return CLAIMED if self.client.set(key, CLAIMED, nx=True, ex=self.claim_ttl) else IN_PROGRESS
+        return DONE if state.decode("utf-8") == DONE else IN_PROGRESS
+
+    def complete(self, key: str):
+        self.client.set(self.prefix + key, DONE, ex=self.ttl)
+
+    def release(self, key: str):
+        self.client.eval(self.RELEASE_SCRIPT, 1, self.prefix + key, CLAIMED)
+
+
+def create_dedup_store(backend: str = None, claim_ttl: float = None) -> DedupStore:
+    """Build the dedup store for the given (or configured) backend"""
+    backend = backend or DEDUP_BACKEND
+    claim_ttl = claim_ttl or DEDUP_CLAIM_TTL_SEC
+    if backend == "local":
+        return LocalDedupStore(DEDUP_MAX_ENTRIES, DEDUP_TTL_SEC, claim_ttl)
+    if backend == "redis":
+        return RedisDedupStore(REDIS_URL, DEDUP_TTL_SEC, claim_ttl)
+    if backend == "none":
+        return DedupStore()
+    raise ValueError(f"Unknown dedup backend: {backend}")
@@ -0,0 +1,174 @@
+"""Wire format of job messages on jobqueue and the worker queues.
+
+A job travels as a versioned msgpack envelope (``encoding`` property
+``msgpack/1``)::
+
+    {"v": 1, "job": {"job_id": ..., "payload": {...}}, "data": <bytes>, "z": <bool>}
+
+``job`` holds everything except ``payload["data"]``, so the scheduler can
+classify from the small routing fields and forward the body unchanged;
+the bulk data is a separately packed blob it never parses. The blob is
+zlib-compressed from ``COMPRESS_THRESHOLD_BYTES`` on (when that helps),
+and from ``CLAIM_CHECK_THRESHOLD_BYTES`` on it is stored in the payload
+store, with only a reference (``ref``) left in the envelope.
+
+Workers get the job without its data; ``job_data(job)`` unpacks or fetches
+it the first time a handler asks. Messages without an ``encoding``
+property are plain JSON jobs, as sent before the envelope existed, and
+``ENVELOPE_ENCODING=json`` keeps sending them that way.
+
+A fused message (``fused/1``) carries several small jobs bound for the same
+queue, each as the body and properties it would have been sent with on its
+own; ``decode_fused`` turns it back into those messages.
+"""
+import json
+import os
+import zlib
+from payload_store import create_payload_store
+from transport import Message
+
+ENVELOPE_ENCODING = os.getenv("ENVELOPE_ENCODING", "msgpack")
+COMPRESS_THRESHOLD_BYTES = int(os.getenv("COMPRESS_THRESHOLD_BYTES", "4096"))
+CLAIM_CHECK_THRESHOLD_BYTES = int(os.getenv("CLAIM_CHECK_THRESHOLD_BYTES", str(32 * 1024)))
+
+ENCODING = "encoding"
+VERSION = 1
+MSGPACK_ENCODING = f"msgpack/{VERSION}"
+FUSED_ENCODING = f"fused/{VERSION}"
+
+# Where a decoded job keeps its still-packed data until job_data() is called
+PACKED_DATA = "_data"
+
+_store = None
+
+
+def payload_store():
+    """Process-wide payload store, created on first use (None when claim check is off)"""
+    global _store
+    if _store is None:
+        _store = create_payload_store() or False
+    return _store or None
+
+
+def encode_job(job: dict, store=None) -> tuple:
+    """Body and message properties for a job; large data goes to ``store`` if one is given"""
+    if ENVELOPE_ENCODING == "json":
+        return json.dumps(job), {}
+
+    import msgpack
+
+    payload = dict(job.get("payload", {}))
+    data = payload.pop("data", None)
+    envelope = {"v": VERSION, "job": {**job, "payload": payload}}
+    if data:
+        blob = msgpack.packb(data)
+        if len(blob) >= COMPRESS_THRESHOLD_BYTES:
+            compressed = zlib.compress(blob, 1)
+            if len(compressed) < len(blob):
+                blob = compressed
+                envelope["z"] = True
+        if store is not None and len(blob) >= CLAIM_CHECK_THRESHOLD_BYTES:
+            envelope["ref"] = store.put(f"payloads/{job['job_id']}", blob)
+        else:
+            envelope["data"] = blob
+    return msgpack.packb(envelope), {ENCODING: MSGPACK_ENCODING}
+
+
+def decode_job(msg) -> dict:
+    """The job in a received message, with its data left packed"""
+    encoding = msg.properties.get(ENCODING)
+    if encoding is None:
+        return json.loads(str(msg))
+    if encoding != MSGPACK_ENCODING:
+        raise ValueError(f"Unsupported message encoding: {encoding}")
+
+    import msgpack
+
+    envelope = msgpack.unpackb(msg.body)
+    job = envelope["job"]
+    if "data" in envelope or "ref" in envelope:
+        job[PACKED_DATA] = {key: envelope[key] for key in ("data", "ref", "z") if key in envelope}
+    return job
+
+
+def repack_job(job: dict) -> tuple:
+    """Body and properties for a modified decoded job, reusing its packed data as is"""
+    packed = job.get(PACKED_DATA)
+    if packed is None:
+        return encode_job(job)
+
+    import msgpack
+
+    header = {key: value for key, value in job.items() if key != PACKED_DATA}
+    return msgpack.packb({"v": VERSION, "job": header, **packed}), {ENCODING: MSGPACK_ENCODING}
+
+
+def encode_fused(messages: list) -> tuple:
+    """Body and properties of one message carrying ``messages``, each kept as sent"""
+    import msgpack
+
+    members = [
+        {"body": m.body.encode("utf-8") if isinstance(m.body, str) else m.body,
+         "properties": m.properties, "message_id": m.message_id}
+        for m in messages
+    ]
+    return msgpack.packb({"v": VERSION, "members": members}), {ENCODING: FUSED_ENCODING}
+
+
+def is_fused(msg) -> bool:
+    return msg.properties.get(ENCODING) == FUSED_ENCODING
+
+
+def decode_fused(msg) -> list:
+    """The member messages of a fused message; they share its delivery count and cannot be settled"""
+    import msgpack
+
+    return [
+        Message(member["body"], properties=member["properties"], message_id=member["message_id"],
+                delivery_count=msg.delivery_count, queue_name=msg.queue_name)
+        for member in msgpack.unpackb(msg.body)["members"]
+    ]
+
+
+def encoding_properties(msg) -> dict:
+    """Properties a forwarded copy of ``msg`` needs so its body still decodes"""
+    return {ENCODING: msg.properties[ENCODING]} if ENCODING in msg.properties else {}
+
+
+def job_data(job: dict, store=None) -> dict:
+    """``payload["data"]`` of a decoded job, unpacked (and fetched) on first access"""
+    payload = job.setdefault("payload", {})
+    if "data" in payload:
+        return payload["data"]
+    packed = job.get(PACKED_DATA)
+    if not packed:
+        return {}
+
+    import msgpack
+
+    blob = packed.get("data")
+    if blob is None:
+        blob = (store or payload_store()).get(packed["ref"])
+    if packed.get("z"):
+        blob = zlib.decompress(blob)
+    payload["data"] = msgpack.unpackb(blob)
+    return payload["data"]
+
+
+def data_ref(job: dict):
+    """Claim-check reference of a decoded job's data, None when the data is inline"""
+    return (job.get(PACKED_DATA) or {}).get("ref")
+
+
+def discard_data(job: dict, store=None):
+    """Delete the job's claim-checked data once it is no longer needed (best effort)"""
+    discard_ref(data_ref(job), store)
+
+
+def discard_ref(ref: dict, store=None):
+    if ref is None:
+        return
+    try:
+        (store or payload_store()).delete(ref)
+    except Exception as e:
+        print(f"Could not delete stored payload {ref.get('key')}: {e}", flush=True)
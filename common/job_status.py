@@ -0,0 +1,79 @@
+"""Job lifecycle events: submitted -> scheduled -> running -> done/failed/quarantined.
+
+Components report transitions with a ``StatusEmitter``, which buffers
+events and sends them to the ``job-status`` queue as one JSON list per
+message, so reporting costs one broker send per batch rather than per job.
+The API consumes that queue into its job store.
+"""
+import json
+import threading
+import time
+
+STATUS_QUEUE = "job-status"
+
+SUBMITTED = "submitted"
+SCHEDULED = "scheduled"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+# Dead-lettered after its last failed attempt; it only runs again if requeued
+QUARANTINED = "quarantined"
+
+# Later states win over earlier ones regardless of arrival order; a failed
+# attempt can still be followed by a retry that runs again
+STATE_RANK = {SUBMITTED: 0, SCHEDULED: 1, RUNNING: 2, FAILED: 2, QUARANTINED: 2, DONE: 3}
+FINAL_STATES = (DONE, QUARANTINED)
+
+
+def status_event(job_id: str, state: str, at: float = None, **fields) -> dict:
+    event = {"job_id": job_id, "state": state, "at": at or time.time()}
+    event.update((key, value) for key, value in fields.items() if value is not None)
+    return event
+
+
+class StatusEmitter:
+    """Buffers events and sends them from a background thread every ``max_delay`` seconds"""
+
+    def __init__(self, broker, max_batch: int = 200, max_delay: float = 0.25):
+        self.broker = broker
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="STATUS", daemon=True)
+        self._thread.start()
+
+    def emit(self, job_id: str, state: str, **fields):
+        if not job_id:
+            return
+        with self._cond:
+            self._pending.append(status_event(job_id, state, **fields))
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def _send(self, events: list):
+        for start in range(0, len(events), self.max_batch):
+            try:
+                self.broker.send(STATUS_QUEUE, json.dumps(events[start:start + self.max_batch]))
+            except Exception as e:
+                # Status is best effort; never hold up the job itself
+                print(f"[STATUS] Dropped {len(events[start:start + self.max_batch])} status event(s): {e}", flush=True)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.max_delay)
+                events, self._pending = self._pending, []
+                closed = self._closed
+            if events:
+                self._send(events)
+            if closed:
+                return
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
@@ -0,0 +1,24 @@
+"""Prometheus metrics shared by every component.
+
+Every component registers its metrics in the default registry with the
+bucket sets below, so histograms line up across dashboards, and exposes
+them on ``/metrics``. The API serves the page from its own app; the other
+components start a metrics server on their port.
+
+    API            8000  (same port as the API)
+    workers        8002 (actor), 8003 (spark), 8004 (general)
+    scheduler      8005
+    orchestrator   8080
+"""
+from prometheus_client import start_http_server
+
+# In-process work: request handling, classification, a control-loop tick
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Jobs: waits and run times, from sub-second up to half an hour
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def start_metrics_server(tag: str, port: int):
+    start_http_server(port)
+    print(f"[{tag}] Metrics server started on port {port}", flush=True)
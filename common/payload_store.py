@@ -0,0 +1,132 @@
+"""Object storage for job data too large to travel in a message (claim check).
+
+``put`` stores a blob and returns a small reference dict that goes into the
+message instead; ``get`` and ``delete`` take that reference. The backend is
+picked with ``PAYLOAD_STORE_BACKEND``:
+
+- ``minio``: the MinIO server from ``k8s/minio.yaml`` (or any S3 endpoint)
+- ``azure``: an Azure Blob Storage container
+- ``memory``: an in-process dict for laptop runs and benchmarks
+- ``none``: no store; large data stays inline in the message
+"""
+import io
+import os
+import threading
+
+PAYLOAD_STORE_BACKEND = os.getenv("PAYLOAD_STORE_BACKEND", "none")
+PAYLOAD_BUCKET = os.getenv("PAYLOAD_BUCKET", "job-payloads")
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "minio:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
+MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
+AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+
+
+class PayloadStore:
+    def put(self, key: str, blob: bytes) -> dict:
+        raise NotImplementedError
+
+    def get(self, ref: dict) -> bytes:
+        raise NotImplementedError
+
+    def delete(self, ref: dict):
+        raise NotImplementedError
+
+
+class MemoryPayloadStore(PayloadStore):
+    def __init__(self):
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def put(self, key: str, blob: bytes) -> dict:
+        with self._lock:
+            self._blobs[key] = blob
+        return {"store": "memory", "key": key, "size": len(blob)}
+
+    def get(self, ref: dict) -> bytes:
+        with self._lock:
+            return self._blobs[ref["key"]]
+
+    def delete(self, ref: dict):
+        with self._lock:
+            self._blobs.pop(ref["key"], None)
+
+
+class MinioPayloadStore(PayloadStore):
+    """Objects in one bucket, created on first use"""
+
+    def __init__(self, endpoint: str, access_key: str, secret_key: str, bucket: str, secure: bool = False):
+        from minio import Minio
+
+        self.client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+        self.bucket = bucket
+        self._bucket_ready = False
+
+    def put(self, key: str, blob: bytes) -> dict:
+        if not self._bucket_ready:
+            if not self.client.bucket_exists(self.bucket):
+                self.client.make_bucket(self.bucket)
+            self._bucket_ready = True
+        self.client.put_object(self.bucket, key, io.BytesIO(blob), len(blob))
+        return {"store": "minio", "bucket": self.bucket, "key": key, "size": len(blob)}
+
+    def get(self, ref: dict) -> bytes:
+        response = self.client.get_object(ref.get("bucket", self.bucket), ref["key"])
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def delete(self, ref: dict):
+        self.client.remove_object(ref.get("bucket", self.bucket), ref["key"])
+
+
+class AzureBlobPayloadStore(PayloadStore):
+    """Blobs in one container, created on first use"""
+
+    def __init__(self, connection_string: str, container: str):
+        from azure.storage.blob import BlobServiceClient
+
+        self.service = BlobServiceClient.from_connection_string(connection_string)
+        self.container = container
+        self._container_ready = False
+
+    def put(self, key: str, blob: bytes) -> dict:
+        if not self._container_ready:
+            from azure.core.exceptions import ResourceExistsError
+
+            try:
+                self.service.create_container(self.container)
+            except ResourceExistsError:
+                pass
+            self._container_ready = True
+        self.service.get_blob_client(self.container, key).upload_blob(blob, overwrite=True)
+        return {"store": "azure", "bucket": self.container, "key": key, "size": len(blob)}
+
+    def get(self, ref: dict) -> bytes:
+        return self.service.get_blob_client(ref.get("bucket", self.container), ref["key"]).download_blob().readall()
+
+    def delete(self, ref: dict):
+        self.service.get_blob_client(ref.get("bucket", self.container), ref["key"]).delete_blob()
+
+
+_memory_store = None
+
+
+def create_payload_store(backend: str = None):
+    """Build the payload store for the given (or configured) backend; None when disabled"""
+    global _memory_store
+    backend = backend or PAYLOAD_STORE_BACKEND
+    if backend == "minio":
+        return MinioPayloadStore(MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY, PAYLOAD_BUCKET, MINIO_SECURE)
+    if backend == "azure":
+        return AzureBlobPayloadStore(AZURE_STORAGE_CONNECTION_STRING, PAYLOAD_BUCKET)
+    if backend == "memory":
+        # One shared instance so every component in the process sees the same blobs
+        if _memory_store is None:
+            _memory_store = MemoryPayloadStore()
+        return _memory_store
+    if backend == "none":
+        return None
+    raise ValueError(f"Unknown payload store backend: {backend}")
@@ -0,0 +1,40 @@
+"""Priority lanes for the worker queues.
+
+Every workload queue has a high-priority sibling, ``<queue>-high``. The
+scheduler routes each job to the lane matching ``payload.priority``,
+workers consume both lanes with the high lane weighted up, and the
+orchestrator sizes deployments from the depth of all lanes together.
+Senders stamp ``enqueued_at`` on every routed message so consumers can
+report how long each priority waited.
+"""
+import time
+
+PRIORITIES = ("high", "normal")
+ENQUEUED_AT = "enqueued_at"
+
+
+def job_priority(job: dict) -> str:
+    """Priority named in the job payload, anything unknown counting as normal"""
+    priority = job.get("payload", {}).get("priority")
+    return priority if priority in PRIORITIES else "normal"
+
+
+def lane_queue(queue_name: str, priority: str) -> str:
+    return f"{queue_name}-high" if priority == "high" else queue_name
+
+
+def lane_queues(queue_name: str) -> list:
+    """All lanes of a workload queue, highest priority first"""
+    return [lane_queue(queue_name, priority) for priority in PRIORITIES]
+
+
+def lane_properties(priority: str) -> dict:
+    return {"priority": priority, ENQUEUED_AT: time.time()}
+
+
+def queue_wait(msg, now: float = None):
+    """Seconds a received message spent queued in its lane, or None if it was never stamped"""
+    enqueued_at = msg.properties.get(ENQUEUED_AT)
+    if enqueued_at is None:
+        return None
+    return max(0.0, (now or time.time()) - float(enqueued_at))
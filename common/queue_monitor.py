@@ -0,0 +1,131 @@
+"""Cached views of slow-changing state, refreshed on a background thread.
+
+Routing and status endpoints read the latest snapshot from memory instead
+of calling the broker (or Azure) on every message or request.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Refresher:
+    """Calls ``fetch()`` every ``interval`` seconds and keeps the last good result"""
+
+    def __init__(self, name: str, fetch, interval: float = 5.0, initial=None):
+        self.name = name
+        self.fetch = fetch
+        self.interval = interval
+        self.value = initial
+        self.updated_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        try:
+            self.value = self.fetch()
+            self.updated_at = time.time()
+        except Exception as e:
+            print(f"[{self.name}] Refresh failed, keeping last snapshot: {e}", flush=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def age(self) -> float:
+        """Seconds since the last successful refresh (infinite before the first one)"""
+        if self.updated_at is None:
+            return float("inf")
+        return time.time() - self.updated_at
+
+
+class QueueMonitor(Refresher):
+    """Depths of a fixed set of queues, read over the monitor's own broker connection"""
+
+    def __init__(self, broker_factory, queues: list, interval: float = 5.0, name: str = "QUEUE-MONITOR"):
+        super().__init__(name, self._fetch_depths, interval, initial={})
+        self.broker_factory = broker_factory
+        self.queues = list(queues)
+        self._broker = None
+
+    def _fetch_depths(self) -> dict:
+        if self._broker is None:
+            self._broker = self.broker_factory()
+        depths = dict(self.value)
+        failed = []
+        for queue_name in self.queues:
+            try:
+                depths[queue_name] = self._broker.queue_depth(queue_name)
+            except Exception:
+                failed.append(queue_name)
+        if failed:
+            print(f"[{self.name}] Could not read depth of {', '.join(failed)}", flush=True)
+        return depths
+
+    def depth(self, *queue_names) -> int:
+        """Summed cached depth of the given queues; unknown queues count as empty"""
+        depths = self.value
+        return sum(depths.get(queue_name, 0) for queue_name in queue_names)
+
+
+class QueueStatusMonitor(Refresher):
+    """Active, dead-letter and scheduled counts of many queues, fetched concurrently.
+
+    A queue whose fetch fails keeps its last good counts with their own
+    timestamp; anything older than ``stale_after`` is flagged stale rather
+    than reported as empty. Counts are read over the monitor's own broker
+    connection, so a failing read cannot break the caller's.
+    """
+
+    def __init__(self, broker_factory, queues: list, interval: float = 5.0, stale_after: float = None,
+                 max_workers: int = 8, name: str = "QUEUE-STATUS"):
+        super().__init__(name, self._fetch_all, interval, initial={})
+        self.broker_factory = broker_factory
+        self._broker = None
+        self.queues = list(queues)
+        self.stale_after = stale_after or 3 * interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    def _fetch_one(self, queue_name: str) -> dict:
+        try:
+            return {**self._broker.queue_properties(queue_name), "updated_at": time.time()}
+        except Exception as e:
+            previous = self.value.get(queue_name, {"active": None, "dead_letter": None,
+                                                   "scheduled": None, "updated_at": None})
+            return {**previous, "error": str(e)}
+
+    def _fetch_all(self) -> dict:
+        if self._broker is None:
+            self._broker = self.broker_factory()
+        return dict(zip(self.queues, self._executor.map(self._fetch_one, self.queues)))
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        queues = {}
+        for queue_name in self.queues:
+            entry = dict(self.value.get(queue_name, {"active": None, "dead_letter": None,
+                                                     "scheduled": None, "updated_at": None}))
+            updated_at = entry.pop("updated_at")
+            entry["age_sec"] = None if updated_at is None else round(now - updated_at, 3)
+            entry["stale"] = updated_at is None or now - updated_at > self.stale_after
+            queues[queue_name] = entry
+        age = self.age()
+        return {
+            "queues": queues,
+            "age_sec": None if age == float("inf") else round(age, 3),
+            "stale": age > self.stale_after
+        }
+
+    def stop(self):
+        super().stop()
+        self._executor.shutdown(wait=False)
+        if self._broker is not None:
+            self._broker.close()
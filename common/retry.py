@@ -0,0 +1,204 @@
+"""Retries with exponential backoff, and quarantine of poison messages.
+
+Abandoning a failed message makes the broker redeliver it at once, so a
+poison job or a failing dependency spins in a hot loop until the max
+delivery count. Instead, ``settle_failed`` completes the failed message
+and sends a copy scheduled ``backoff_delay(attempt)`` seconds ahead. The
+copy carries the attempt count and the error class in its properties::
+
+    {"retry_attempt": 2, "retry_error": "TimeoutError", ...}
+
+A job that fails with a permanent error class (``RETRY_PERMANENT_ERRORS``,
+matched against the exception and its base classes) or on its
+``RETRY_MAX_ATTEMPTS``-th attempt is quarantined instead: dead-lettered on
+its queue with the error class as the reason. The API's ``/dead-letters``
+endpoints list those messages and ``requeue`` sends them back for a fresh
+set of attempts.
+
+Queues detect duplicates by message id, so every copy sent again gets its
+own id, ``<original id>.<kind>-<n>`` for its ``n``-th resend; the original
+id, which is the job id, travels in the ``original_message_id`` property.
+
+Members of a fused message cannot be settled on their own. A failed
+member is sent back alone, as a scheduled retry or marked with
+``quarantine``, and whoever receives a marked message dead-letters it
+without running it (``quarantine_marked``).
+"""
+import os
+import random
+import time
+from transport import DEAD_LETTER_DESCRIPTION, DEAD_LETTER_REASON, Message
+from priority import ENQUEUED_AT
+from job_status import QUARANTINED
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY_SEC = float(os.getenv("RETRY_BASE_DELAY_SEC", "2"))
+RETRY_MAX_DELAY_SEC = float(os.getenv("RETRY_MAX_DELAY_SEC", "300"))
+RETRY_PERMANENT_ERRORS = {
+    name.strip() for name in os.getenv("RETRY_PERMANENT_ERRORS", "PermanentError,ValueError,TypeError,KeyError").split(",")
+    if name.strip()
+}
+
+RETRY_ATTEMPT = "retry_attempt"
+RETRY_ERROR = "retry_error"
+QUARANTINE = "quarantine"
+ORIGINAL_ID = "original_message_id"
+RESEND_COUNT = "resend_count"
+
+# How a failed message was settled: RETRIED or QUARANTINED, the job state it ends up in
+RETRIED = "retried"
+
+# Dead-letter descriptions are kept short; the full error is in the logs
+MAX_DESCRIPTION = 1000
+
+
+class PermanentError(Exception):
+    """Raised for a job that fails the same way however often it runs"""
+
+
+def error_class(error: BaseException) -> str:
+    return type(error).__name__
+
+
+def is_permanent(error: BaseException) -> bool:
+    return any(cls.__name__ in RETRY_PERMANENT_ERRORS for cls in type(error).__mro__)
+
+
+def failed_attempts(msg) -> int:
+    """Attempts of the message's job that failed before this one"""
+    return int(msg.properties.get(RETRY_ATTEMPT) or 0)
+
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """Seconds before retry ``attempt`` (1 for the first): doubling up to ``cap``, jittered over its upper half"""
+    base = RETRY_BASE_DELAY_SEC if base is None else base
+    cap = RETRY_MAX_DELAY_SEC if cap is None else cap
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def original_id(msg) -> str:
+    """Id the message's job was first sent with, shared by all its resends"""
+    return msg.properties.get(ORIGINAL_ID) or msg.message_id
+
+
+def resent_message(msg, kind: str, properties: dict = None, scheduled_at: float = None,
+                   count: int = None) -> Message:
+    """Copy of ``msg`` to send again, under an id duplicate detection has not seen.
+
+    The id only depends on the copied message (or on ``count``, for callers
+    that track resends themselves), so sending the same copy twice after a
+    crash still leaves one of them to be dropped.
+    """
+    if count is None:
+        count = int(msg.properties.get(RESEND_COUNT) or 0) + 1
+    properties = {**(msg.properties if properties is None else properties),
+                  ORIGINAL_ID: original_id(msg), RESEND_COUNT: count}
+    return Message(msg.body, properties=properties, message_id=f"{original_id(msg)}.{kind}-{count}",
+                   scheduled_at=scheduled_at)
+
+
+def describe(error: BaseException, attempt: int) -> str:
+    return f"attempt {attempt}: {error}"[:MAX_DESCRIPTION]
+
+
+def retry_message(msg, error: BaseException, attempt: int, now: float = None) -> Message:
+    """Copy of a failed message for retry ``attempt``, scheduled after the backoff"""
+    scheduled_at = (now or time.time()) + backoff_delay(attempt)
+    properties = {**msg.properties, RETRY_ATTEMPT: attempt, RETRY_ERROR: error_class(error)}
+    if ENQUEUED_AT in properties:
+        # The queue wait of a retry starts once it becomes receivable
+        properties[ENQUEUED_AT] = scheduled_at
+    return resent_message(msg, "retry", properties, scheduled_at)
+
+
+def next_message(msg, error: BaseException, now: float = None):
+    """What to do with a failed message: (RETRIED, its retry) or (QUARANTINED, None)"""
+    attempt = failed_attempts(msg) + 1
+    if is_permanent(error) or attempt >= RETRY_MAX_ATTEMPTS:
+        return QUARANTINED, None
+    return RETRIED, retry_message(msg, error, attempt, now)
+
+
+def settle_failed(broker, msg, error: BaseException, now: float = None) -> str:
+    """Settle a received message whose job failed; returns RETRIED or QUARANTINED.
+
+    The retry is sent before the original is completed, so a crash in
+    between leaves a duplicate (dropped by dedup) rather than losing the job.
+    """
+    outcome, retry = next_message(msg, error, now)
+    if outcome == QUARANTINED:
+        broker.dead_letter(msg, error_class(error), describe(error, failed_attempts(msg) + 1))
+    else:
+        broker.send(msg.queue_name, retry)
+        broker.complete(msg)
+    return outcome
+
+
+def member_message(msg, error: BaseException, now: float = None) -> tuple:
+    """(outcome, message to send back) for a failed member of a fused message"""
+    outcome, retry = next_message(msg, error, now)
+    if outcome == QUARANTINED:
+        attempt = failed_attempts(msg) + 1
+        retry = resent_message(msg, "quarantine", {
+            **msg.properties, RETRY_ATTEMPT: attempt, RETRY_ERROR: error_class(error),
+            QUARANTINE: describe(error, attempt)
+        })
+    return outcome, retry
+
+
+def quarantine_marked(broker, msg) -> bool:
+    """Dead-letter a message marked for quarantine; False for any other message"""
+    description = msg.properties.get(QUARANTINE)
+    if description is None:
+        return False
+    broker.dead_letter(msg, msg.properties.get(RETRY_ERROR) or "Quarantined", description)
+    return True
+
+
+def requeued_message(msg) -> Message:
+    """Fresh copy of a dead-lettered message, with its retry history cleared"""
+    dropped = (RETRY_ATTEMPT, RETRY_ERROR, QUARANTINE, DEAD_LETTER_REASON, DEAD_LETTER_DESCRIPTION)
+    properties = {key: value for key, value in msg.properties.items() if key not in dropped}
+    if ENQUEUED_AT in properties:
+        properties[ENQUEUED_AT] = time.time()
+    return resent_message(msg, "requeue", properties)
+
+
+def dead_letter_info(msg) -> dict:
+    """What the API reports about a dead-lettered message"""
+    # A message marked for quarantine was dead-lettered on receipt, not after running
+    ran = 0 if QUARANTINE in msg.properties else max(msg.delivery_count, 1)
+    return {
+        "job_id": original_id(msg),
+        "message_id": msg.message_id,
+        "reason": msg.properties.get(DEAD_LETTER_REASON),
+        "description": msg.properties.get(DEAD_LETTER_DESCRIPTION),
+        "attempts": failed_attempts(msg) + ran,
+    }
+
+
+def requeue(broker, queue_name: str, job_ids: set = None, limit: int = 100) -> int:
+    """Move up to ``limit`` dead-lettered messages back onto their queue; only those of ``job_ids`` if given.
+
+    Messages that are received but not selected stay locked until the scan
+    ends, so none is looked at twice, and are then put back.
+    """
+    held = []
+    requeued = 0
+    try:
+        while len(held) + requeued < limit:
+            received = broker.receive_dead_letters(queue_name, max_count=limit - len(held) - requeued, max_wait=1)
+            if not received:
+                break
+            for msg in received:
+                if job_ids is not None and original_id(msg) not in job_ids:
+                    held.append(msg)
+                    continue
+                broker.send(queue_name, requeued_message(msg))
+                broker.complete(msg)
+                requeued += 1
+    finally:
+        for msg in held:
+            broker.abandon(msg)
+    return requeued
@@ -0,0 +1,102 @@
+"""Buffered, sampled logging for the per-job hot path.
+
+A component's logger only appends records to a bounded in-process queue;
+a listener thread formats them and writes them to stdout and, when
+configured, Application Insights. A full buffer drops records (counted in
+``dropped``) rather than blocking the job that logged them.
+
+Per-job lines go through ``Telemetry.job``, which keeps only a
+``JOB_LOG_SAMPLE_RATE`` fraction of jobs. The decision is made from the job
+id, so a sampled job is logged at every hop and in every component. Volumes
+and latencies belong in the metrics, which count every job.
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import zlib
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+JOB_LOG_SAMPLE_RATE = float(os.getenv("JOB_LOG_SAMPLE_RATE", "0.1"))
+TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "10000"))
+
+
+def sampled(job_id, rate: float = None) -> bool:
+    """Whether the job's per-job lines are logged; the same id always gets the same answer"""
+    rate = JOB_LOG_SAMPLE_RATE if rate is None else rate
+    if rate >= 1:
+        return True
+    if rate <= 0 or not job_id:
+        return False
+    return zlib.crc32(str(job_id).encode()) % 10000 < rate * 10000
+
+
+class BufferedHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread as they are; drops them when the buffer is full"""
+
+    def __init__(self, maxsize: int):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Same process, so the record needs no pickling; formatting happens on the listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BufferListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room instead of failing when the buffer is full, so close() always flushes
+        self.queue.put(self._sentinel)
+
+
+class Telemetry:
+    """Logger of one component, exported by a background listener"""
+
+    def __init__(self, component: str, connection_string: str = None, level: str = None,
+                 sample_rate: float = None, queue_size: int = None, handlers: list = None):
+        self.component = component
+        self.sample_rate = JOB_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.logger = logging.getLogger(component.lower())
+        self.logger.setLevel(level or LOG_LEVEL)
+        self.logger.propagate = False
+
+        if handlers is None:
+            stream = logging.StreamHandler(sys.stdout)
+            stream.setFormatter(logging.Formatter(f"[{component}] %(message)s"))
+            handlers = [stream]
+            if connection_string:
+                from opencensus.ext.azure.log_exporter import AzureLogHandler
+
+                handlers.append(AzureLogHandler(connection_string=connection_string))
+
+        self.handler = BufferedHandler(queue_size or TELEMETRY_QUEUE_SIZE)
+        self.logger.addHandler(self.handler)
+        self.listener = BufferListener(self.handler.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped
+
+    def job(self, job_id, message: str, *args, level: int = logging.INFO, **dimensions):
+        """Log a per-job line if the job is sampled; ``message % args`` is only built on the listener.
+
+        ``dimensions`` become Application Insights custom dimensions.
+        """
+        if not self.logger.isEnabledFor(level) or not sampled(job_id, self.sample_rate):
+            return
+        self.logger.log(level, message, *args, extra={"custom_dimensions": {"job_id": job_id, **dimensions}})
+
+    def close(self):
+        """Flush buffered records; safe to call more than once"""
+        if self.listener._thread is not None:
+            self.listener.stop()
@@ -0,0 +1,54 @@
+"""Per-stage timestamps carried with a job from submission to completion.
+
+The API starts a trace when a job is submitted. Every hop copies the trace
+properties of the message it received onto the message it sends and adds
+its own stamp, all in application properties so job bodies stay untouched.
+The worker that runs the job turns the stamps into stage durations:
+
+    queue_wait   submitted_at -> picked_at     waiting in jobqueue
+    schedule     picked_at    -> enqueued_at   classification and routing
+    dispatch     enqueued_at  -> started_at    waiting in the worker queue
+    execute      started_at   -> finished_at   running the handler
+    end_to_end   submitted_at -> finished_at
+
+Stamps come from different hosts, so stages spanning two components are
+only as accurate as their clocks; negative values from skew are clamped to 0.
+"""
+import time
+import uuid
+from priority import ENQUEUED_AT
+
+TRACE_ID = "trace_id"
+SUBMITTED_AT = "submitted_at"
+PICKED_AT = "picked_at"
+STARTED_AT = "started_at"
+FINISHED_AT = "finished_at"
+
+# Properties forwarded from hop to hop; enqueued_at is re-stamped by every sender
+TRACE_PROPERTIES = (TRACE_ID, SUBMITTED_AT, PICKED_AT)
+
+STAGES = (
+    ("queue_wait", SUBMITTED_AT, PICKED_AT),
+    ("schedule", PICKED_AT, ENQUEUED_AT),
+    ("dispatch", ENQUEUED_AT, STARTED_AT),
+    ("execute", STARTED_AT, FINISHED_AT),
+    ("end_to_end", SUBMITTED_AT, FINISHED_AT),
+)
+
+
+def new_trace(now: float = None) -> dict:
+    return {TRACE_ID: uuid.uuid4().hex, SUBMITTED_AT: now or time.time()}
+
+
+def carry(msg) -> dict:
+    """Trace properties of a received message, to be copied onto the next one"""
+    return {key: msg.properties[key] for key in TRACE_PROPERTIES if key in msg.properties}
+
+
+def stage_durations(stamps: dict) -> dict:
+    """Seconds spent in every stage whose two stamps are both known"""
+    durations = {}
+    for stage, begin, end in STAGES:
+        if stamps.get(begin) is not None and stamps.get(end) is not None:
+            durations[stage] = max(0.0, float(stamps[end]) - float(stamps[begin]))
+    return durations
@@ -0,0 +1,219 @@
+"""Replica policies for the orchestrator.
+
+Kept free of Kubernetes and broker imports so the simulation harness in
+``scripts/simulate_autoscaler.py`` can drive the exact same code.
+"""
+import collections
+import math
+
+
+def calculate_needed_replicas(queue_depth, threshold, min_replicas=1, max_replicas=10):
+    """Original policy: one replica per `threshold` queued messages"""
+    if queue_depth == 0:
+        return min_replicas
+    needed = (queue_depth // threshold) + 1
+    return min(max(needed, min_replicas), max_replicas)
+
+
+class HoltForecaster:
+    """Double exponential smoothing (level + trend) of a rate sampled each tick"""
+
+    def __init__(self, alpha: float = 0.5, beta: float = 0.3):
+        self.alpha = alpha
+        self.beta = beta
+        self.level = None
+        self.trend = 0.0
+
+    def update(self, value: float):
+        if self.level is None:
+            self.level = value
+            return
+        previous = self.level
+        self.level = self.alpha * value + (1 - self.alpha) * (self.level + self.trend)
+        self.trend = self.beta * (self.level - previous) + (1 - self.beta) * self.trend
+
+    def forecast(self, steps: float) -> float:
+        if self.level is None:
+            return 0.0
+        return max(0.0, self.level + self.trend * steps)
+
+
+class WindowedCounter:
+    """Change of a monotonically increasing counter over a sliding time window"""
+
+    def __init__(self, window_sec: float):
+        self.window_sec = window_sec
+        self.samples = collections.deque()
+
+    def add(self, now: float, value: float):
+        self.samples.append((now, value))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= self.window_sec:
+            self.samples.popleft()
+
+    def delta(self) -> float:
+        if len(self.samples) < 2:
+            return 0.0
+        return self.samples[-1][1] - self.samples[0][1]
+
+
+class PodCounters:
+    """Fleet-wide totals of per-pod cumulative counters that never go down.
+
+    A plain sum over pods drops whenever a pod goes away or one scrape
+    fails, and the next tick would count the difference as new work.
+    ``update`` instead adds up how much each pod's counters grew since that
+    pod's previous scrape. A pod seen for the first time, or whose counter
+    went down (it restarted), adds nothing that tick. A pod whose scrape
+    failed (None) keeps its last totals, so its growth is counted on the next
+    successful scrape. A pod no longer listed is forgotten.
+    """
+
+    def __init__(self, keys: tuple):
+        self.totals = dict.fromkeys(keys, 0.0)
+        self.last = {}
+
+    def update(self, pods: dict) -> dict:
+        """Fold {pod: totals or None} into the fleet totals and return them"""
+        for pod, totals in pods.items():
+            if totals is None:
+                continue
+            previous = self.last.get(pod)
+            if previous is not None:
+                for key in self.totals:
+                    grown = totals.get(key, 0.0) - previous.get(key, 0.0)
+                    if grown > 0:
+                        self.totals[key] += grown
+            self.last[pod] = totals
+        for pod in [pod for pod in self.last if pod not in pods]:
+            del self.last[pod]
+        return dict(self.totals)
+
+
+def erlang_c(servers: int, offered_load: float) -> float:
+    """Probability an arrival has to queue in an M/M/c system"""
+    if offered_load >= servers:
+        return 1.0
+    # Erlang B by recurrence, then converted to Erlang C; stable for large c
+    b = 1.0
+    for k in range(1, servers + 1):
+        b = offered_load * b / (k + offered_load * b)
+    return servers * b / (servers - offered_load * (1 - b))
+
+
+def servers_for_slo(arrival_rate: float, service_time: float, slo_sec: float,
+                    max_servers: int, max_utilization: float = 0.9) -> int:
+    """Smallest number of M/M/c servers whose mean response time meets the SLO"""
+    if arrival_rate <= 0:
+        return 0
+    service_rate = 1.0 / service_time
+    offered_load = arrival_rate * service_time
+    for servers in range(max(1, math.ceil(offered_load)), max_servers + 1):
+        if offered_load / servers > max_utilization:
+            continue
+        if service_time >= slo_sec:
+            # The SLO cannot be met by adding servers; settle for the utilization cap
+            return servers
+        wait = erlang_c(servers, offered_load) / (servers * service_rate - arrival_rate)
+        if wait + service_time <= slo_sec:
+            return servers
+    return max_servers
+
+
+class PredictiveScaler:
+    """Rate-based replica policy with a queueing model and stabilization.
+
+    Each tick the orchestrator feeds ``observe()`` the queue depth plus the
+    workers' cumulative completion count and duration histogram totals,
+    summed over pods with ``PodCounters`` so they never go down.
+    Arrivals are inferred as depth change plus completions, smoothed with
+    Holt's method and projected ``horizon_sec`` ahead. Replicas are sized
+    with an M/M/c model so the mean response time stays under ``slo_sec``,
+    with extra capacity to drain the current backlog within the SLO.
+
+    Scale-ups apply immediately (at most once per ``scale_up_cooldown_sec``);
+    scale-downs use the highest recommendation from the last
+    ``stabilization_sec`` and wait ``scale_down_cooldown_sec`` after any change.
+    """
+
+    def __init__(self, slots_per_replica: int, slo_sec: float, min_replicas: int = 1, max_replicas: int = 10,
+                 window_sec: float = 60, horizon_sec: float = 30, alpha: float = 0.5, beta: float = 0.3,
+                 stabilization_sec: float = 120, scale_up_cooldown_sec: float = 15,
+                 scale_down_cooldown_sec: float = 60, default_service_time: float = 1.0):
+        self.slots_per_replica = slots_per_replica
+        self.slo_sec = slo_sec
+        self.min_replicas = min_replicas
+        self.max_replicas = max_replicas
+        self.horizon_sec = horizon_sec
+        self.stabilization_sec = stabilization_sec
+        self.scale_up_cooldown_sec = scale_up_cooldown_sec
+        self.scale_down_cooldown_sec = scale_down_cooldown_sec
+        self.default_service_time = default_service_time
+
+        self.forecaster = HoltForecaster(alpha, beta)
+        self.duration_sum = WindowedCounter(window_sec)
+        self.duration_count = WindowedCounter(window_sec)
+        self.recommendations = collections.deque()
+        self.last = None
+        self.depth = 0
+        self.tick_sec = 1.0
+        self.current = min_replicas
+        self.last_scale_up = -math.inf
+        self.last_change = -math.inf
+
+    def observe(self, now: float, depth: int, completed_total: float,
+                duration_sum: float = None, duration_count: float = None):
+        if self.last is not None:
+            last_time, last_depth, last_completed = self.last
+            # Totals that went down are never new completions; PodCounters keeps them from doing so
+            completed = max(0.0, completed_total - last_completed)
+            elapsed = now - last_time
+            if elapsed > 0:
+                self.tick_sec = elapsed
+                self.forecaster.update(max(0, depth - last_depth + completed) / elapsed)
+        if duration_sum is not None and duration_count is not None:
+            self.duration_sum.add(now, duration_sum)
+            self.duration_count.add(now, duration_count)
+        self.last = (now, depth, completed_total)
+        self.depth = depth
+
+    def service_time(self) -> float:
+        count = self.duration_count.delta()
+        total = self.duration_sum.delta()
+        if count > 0 and total > 0:
+            return total / count
+        return self.default_service_time
+
+    def arrival_rate(self) -> float:
+        """Projected arrival rate; a falling trend never goes below the current level"""
+        projected = self.forecaster.forecast(self.horizon_sec / self.tick_sec)
+        return max(projected, self.forecaster.forecast(0))
+
+    def recommend(self) -> int:
+        """Replicas the model wants right now, before stabilization"""
+        service_time = self.service_time()
+        # Capacity to clear the current backlog within the SLO on top of new arrivals
+        demand = self.arrival_rate() + self.depth / self.slo_sec
+        servers = servers_for_slo(demand, service_time, self.slo_sec, self.max_replicas * self.slots_per_replica)
+        replicas = math.ceil(servers / self.slots_per_replica)
+        return min(max(replicas, self.min_replicas), self.max_replicas)
+
+    def desired(self, now: float) -> int:
+        recommended = self.recommend()
+        self.recommendations.append((now, recommended))
+        while self.recommendations and now - self.recommendations[0][0] > self.stabilization_sec:
+            self.recommendations.popleft()
+
+        target = self.current
+        if recommended > self.current:
+            if now - self.last_scale_up >= self.scale_up_cooldown_sec:
+                target = recommended
+                self.last_scale_up = now
+        else:
+            stabilized = max(r for _, r in self.recommendations)
+            if stabilized < self.current and now - self.last_change >= self.scale_down_cooldown_sec:
+                target = stabilized
+
+        if target != self.current:
+            self.last_change = now
+            self.current = target
+        return self.current
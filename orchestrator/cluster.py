@@ -0,0 +1,109 @@
+import threading
+import time
+from kubernetes import client, config, watch
+
+
+def load_kube_config():
+    try:
+        config.load_incluster_config()
+    except config.ConfigException:
+        config.load_kube_config()
+
+
+class ClusterView:
+    """Long-lived Kubernetes clients plus a watch-fed cache of the namespace.
+
+    Two background threads keep ``replicas`` (deployment -> spec.replicas)
+    and ``pod_ips`` (app label -> IPs of running pods) current, so the
+    control loop reads them from memory instead of calling the API server
+    every tick. Watches are restarted from a fresh list whenever they end.
+    """
+
+    def __init__(self, namespace: str):
+        load_kube_config()
+        self.namespace = namespace
+        self.apps_v1 = client.AppsV1Api()
+        self.core_v1 = client.CoreV1Api()
+        self.replicas = {}
+        self.pods = {}
+        self._lock = threading.Lock()
+        self._deployments_listed = threading.Event()
+        self._pods_listed = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._watch_deployments, daemon=True).start()
+        threading.Thread(target=self._watch_pods, daemon=True).start()
+        self._deployments_listed.wait(timeout=10)
+        self._pods_listed.wait(timeout=10)
+
+    def _run_watch(self, list_call, apply, reset, listed):
+        while True:
+            try:
+                listing = list_call(self.namespace)
+                with self._lock:
+                    reset()
+                    for item in listing.items:
+                        apply("ADDED", item)
+                listed.set()
+                stream = watch.Watch().stream(
+                    list_call,
+                    self.namespace,
+                    resource_version=listing.metadata.resource_version,
+                    timeout_seconds=300
+                )
+                for event in stream:
+                    with self._lock:
+                        apply(event["type"], event["object"])
+            except Exception as e:
+                print(f"Watch on {list_call.__name__} failed, relisting: {e}")
+                time.sleep(1)
+
+    def _watch_deployments(self):
+        def apply(event_type, deployment):
+            if event_type == "DELETED":
+                self.replicas.pop(deployment.metadata.name, None)
+            else:
+                self.replicas[deployment.metadata.name] = deployment.spec.replicas
+
+        self._run_watch(self.apps_v1.list_namespaced_deployment, apply, self.replicas.clear,
+                        self._deployments_listed)
+
+    def _watch_pods(self):
+        def apply(event_type, pod):
+            name = pod.metadata.name
+            running = pod.status.phase == "Running" and pod.status.pod_ip
+            if event_type == "DELETED" or not running:
+                self.pods.pop(name, None)
+            else:
+                self.pods[name] = ((pod.metadata.labels or {}).get("app"), pod.status.pod_ip)
+
+        self._run_watch(self.core_v1.list_namespaced_pod, apply, self.pods.clear, self._pods_listed)
+
+    def pod_ips(self, app: str) -> list:
+        with self._lock:
+            return [ip for label, ip in self.pods.values() if label == app]
+
+    def pod_addresses(self, app: str) -> dict:
+        """Pod name -> IP of the running pods of an app"""
+        with self._lock:
+            return {name: ip for name, (label, ip) in self.pods.items() if label == app}
+
+    def scale(self, deployment_name: str, replicas: int):
+        """Patch the scale subresource, skipping the call when the cache already matches.
+
+        Returns whether a patch was sent.
+        """
+        with self._lock:
+            current = self.replicas.get(deployment_name)
+        if current == replicas:
+            return False
+        self.apps_v1.patch_namespaced_deployment_scale(
+            deployment_name,
+            self.namespace,
+            {"spec": {"replicas": replicas}}
+        )
+        with self._lock:
+            # The watch confirms this shortly; record it now so the next tick does not repatch
+            self.replicas[deployment_name] = replicas
+        print(f"Scaled {deployment_name} from {current} to {replicas}")
+        return True
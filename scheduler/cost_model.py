@@ -0,0 +1,115 @@
+"""Runtime prediction for job routing.
+
+``static_cost`` is the original hand-written score. ``CostModel`` learns
+the runtime from the durations workers report back: recursive least
+squares on log-runtime over a few payload features, so the estimate is
+updated in O(features^2) per completed job with no stored history.
+Kept free of broker and Azure imports so ``scripts/evaluate_cost_model.py``
+can replay recorded history through the same code.
+"""
+import json
+import math
+import os
+import threading
+
+FEATURES = ("bias", "log_rows", "log_estimated_runtime", "latency_sensitive", "high_priority")
+
+
+def static_cost(payload: dict, runtime_sec: float = None) -> float:
+    """Original score; runtime_sec replaces the user's estimate when given"""
+    if runtime_sec is None:
+        runtime_sec = payload.get("estimated_runtime_sec", 10)
+    cpu_cost = payload.get("rows", 1000) / 1_000_000
+    time_cost = runtime_sec / 60
+
+    priority_weight = 2 if payload.get("priority") == "high" else 1
+
+    return (cpu_cost + time_cost) * priority_weight
+
+
+def features(payload: dict) -> list:
+    return [
+        1.0,
+        math.log1p(max(0, payload.get("rows") or 0)),
+        math.log1p(max(0, payload.get("estimated_runtime_sec") or 0)),
+        1.0 if payload.get("latency_sensitive") else 0.0,
+        1.0 if payload.get("priority") == "high" else 0.0,
+    ]
+
+
+class CostModel:
+    """Online linear regression of log1p(runtime) on payload features.
+
+    Recursive least squares with a forgetting factor, so the fit follows
+    gradual changes in the workload. Until ``min_samples`` durations have
+    been observed, ``predict_runtime`` returns the user's own estimate.
+    """
+
+    def __init__(self, forgetting: float = 0.999, min_samples: int = 50, prior: float = 100.0):
+        self.forgetting = forgetting
+        self.min_samples = min_samples
+        n = len(FEATURES)
+        self.weights = [0.0] * n
+        # Inverse covariance estimate; a large diagonal means weak initial confidence
+        self.p = [[prior if i == j else 0.0 for j in range(n)] for i in range(n)]
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def update(self, payload: dict, runtime_sec: float):
+        x = features(payload)
+        y = math.log1p(max(0.0, runtime_sec))
+        n = len(x)
+        with self._lock:
+            px = [sum(self.p[i][j] * x[j] for j in range(n)) for i in range(n)]
+            denominator = self.forgetting + sum(x[i] * px[i] for i in range(n))
+            gain = [v / denominator for v in px]
+            error = y - sum(w * v for w, v in zip(self.weights, x))
+            self.weights = [w + g * error for w, g in zip(self.weights, gain)]
+            self.p = [
+                [(self.p[i][j] - gain[i] * px[j]) / self.forgetting for j in range(n)]
+                for i in range(n)
+            ]
+            self.samples += 1
+
+    def ready(self) -> bool:
+        return self.samples >= self.min_samples
+
+    def predict_runtime(self, payload: dict) -> float:
+        if not self.ready():
+            return payload.get("estimated_runtime_sec", 10)
+        x = features(payload)
+        with self._lock:
+            log_runtime = sum(w * v for w, v in zip(self.weights, x))
+        # Clamp before exp so one wild fit cannot overflow
+        return math.expm1(min(max(log_runtime, 0.0), 20.0))
+
+    def cost(self, payload: dict) -> float:
+        """Routing score on the static formula's scale, with the predicted runtime"""
+        return static_cost(payload, self.predict_runtime(payload))
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "features": list(FEATURES),
+                "weights": self.weights,
+                "p": self.p,
+                "samples": self.samples,
+            }
+
+    def load_dict(self, state: dict):
+        if state.get("features") != list(FEATURES):
+            raise ValueError("Saved cost model uses a different feature set")
+        with self._lock:
+            self.weights = state["weights"]
+            self.p = state["p"]
+            self.samples = state["samples"]
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        with open(path) as f:
+            self.load_dict(json.load(f))
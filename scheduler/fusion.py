@@ -0,0 +1,58 @@
+"""Fusion of tiny jobs into composite messages.
+
+Jobs the scheduler routes to a fusing queue are held in a ``Fuser`` per
+queue instead of being sent one by one. A queue's held jobs go out as one
+fused message (``envelope.encode_fused``) as soon as there are
+``max_jobs`` of them, adding the next one would pass ``max_bytes``, or the
+oldest has waited ``max_delay`` seconds. The messages they came from stay
+unsettled until then, so a crash redelivers them; the scheduler settles
+them from its receiving thread once the fused message is sent.
+"""
+import threading
+
+# Bytes a member adds to a fused message besides its body: properties and framing
+MEMBER_OVERHEAD = 256
+
+
+class Fuser:
+    def __init__(self, max_jobs: int = 50, max_bytes: int = 200_000, max_delay: float = 0.1):
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self._held = {}
+        self._lock = threading.Lock()
+
+    def add(self, queue: str, entry, size: int, now: float) -> list:
+        """Hold ``entry`` for ``queue``; returns the (queue, entries) groups that are now full"""
+        full = []
+        with self._lock:
+            held = self._held.get(queue)
+            if held and held["bytes"] + size > self.max_bytes:
+                full.append((queue, self._held.pop(queue)["entries"]))
+                held = None
+            if held is None:
+                held = self._held[queue] = {"entries": [], "bytes": 0, "since": now}
+            held["entries"].append(entry)
+            held["bytes"] += size
+            if len(held["entries"]) >= self.max_jobs or held["bytes"] >= self.max_bytes:
+                full.append((queue, self._held.pop(queue)["entries"]))
+        return full
+
+    def due(self, now: float) -> list:
+        """(queue, entries) groups whose oldest job has waited ``max_delay``"""
+        with self._lock:
+            queues = [queue for queue, held in self._held.items() if now - held["since"] >= self.max_delay]
+            return [(queue, self._held.pop(queue)["entries"]) for queue in queues]
+
+    def drain(self) -> list:
+        with self._lock:
+            groups = [(queue, held["entries"]) for queue, held in self._held.items()]
+            self._held.clear()
+        return groups
+
+    def next_due(self):
+        """When the next group falls due, None when nothing is held"""
+        with self._lock:
+            if not self._held:
+                return None
+            return min(held["since"] for held in self._held.values()) + self.max_delay
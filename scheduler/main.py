@@ -1,37 +1,112 @@
-from azure.servicebus import ServiceBusClient, ServiceBusMessage
-from opencensus.ext.azure.log_exporter import AzureLogHandler
 from opencensus.stats import aggregation as aggregation_module
 from opencensus.stats import measure as measure_module
 from opencensus.stats import stats as stats_module
 from opencensus.stats import view as view_module
 from opencensus.ext.azure import metrics_exporter
-from batch_submitter import BatchJobSubmitter
+from transport import Message, connect_with_retry
+from priority import job_priority, lane_properties, lane_queue, lane_queues
+from cost_model import CostModel, static_cost
+from placement import Placement
+from queue_monitor import QueueMonitor, Refresher
+from dedup import CLAIMED, DONE, create_dedup_store
+from fusion import MEMBER_OVERHEAD, Fuser
+from sharding import create_shard_tracker, plan_shards, shard_id, shard_info, shard_job
+from job_status import DONE as JOB_DONE, FAILED, QUARANTINED, SCHEDULED, StatusEmitter
+from tracing import PICKED_AT, SUBMITTED_AT, TRACE_ID, carry
+from telemetry import Telemetry
+from envelope import data_ref, decode_job, discard_data, discard_ref, encode_fused, encoding_properties, job_data, repack_job
+from retry import failed_attempts, original_id, resent_message, settle_failed
+from prometheus_client import Counter, Histogram
+from metrics import DURATION_BUCKETS, LATENCY_BUCKETS, start_metrics_server
+from concurrent.futures import ThreadPoolExecutor
 import json
 import time
-import sys
 import os
-import logging
 
 # Environment variables
-SERVICEBUS_CONNECTION_STRING = os.getenv("SERVICEBUS_CONNECTION_STRING")
 BATCH_ACCOUNT_NAME = os.getenv("BATCH_ACCOUNT_NAME")
 BATCH_ACCOUNT_KEY = os.getenv("BATCH_ACCOUNT_KEY")
 BATCH_ACCOUNT_URL = os.getenv("BATCH_ACCOUNT_URL")
 APPINSIGHTS_CONNECTION_STRING = os.getenv("APPINSIGHTS_CONNECTION_STRING")
 
-MAX_RETRIES = 10
-RETRY_DELAY = 5
+# Receive/dispatch tuning
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "32"))
+SCHEDULER_PREFETCH = int(os.getenv("SCHEDULER_PREFETCH", str(SCHEDULER_BATCH_SIZE * 2)))
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "8"))
 
-# Setup logging with Application Insights
-logger = logging.getLogger(__name__)
-if APPINSIGHTS_CONNECTION_STRING:
-    logger.addHandler(AzureLogHandler(connection_string=APPINSIGHTS_CONNECTION_STRING))
-    logger.setLevel(logging.INFO)
+# Cost model: "learned" predicts runtime from durations reported on job-results,
+# "static" keeps the original formula on the user's estimated_runtime_sec
+COST_MODEL = os.getenv("COST_MODEL", "learned")
+COST_MODEL_PATH = os.getenv("COST_MODEL_PATH")
+COST_MODEL_MIN_SAMPLES = int(os.getenv("COST_MODEL_MIN_SAMPLES", "50"))
+JOB_HISTORY_PATH = os.getenv("JOB_HISTORY_PATH")
+RESULTS_QUEUE = "job-results"
+# Results are drained between jobqueue batches without holding up routing. Some receivers read
+# a zero wait as "no timeout", hence the small positive one.
+RESULTS_MAX_WAIT = 0.01
+SAVE_EVERY = 100
+
+# Routing: "load-aware" sends ml/spark jobs to AKS or Batch by expected completion
+# time, "static" sends every heavy job to Batch whenever it is configured
+ROUTING_POLICY = os.getenv("ROUTING_POLICY", "load-aware")
+STATE_REFRESH_INTERVAL = float(os.getenv("STATE_REFRESH_INTERVAL", "5"))
+BATCH_POOL_ID = os.getenv("BATCH_POOL_ID")
+BATCH_OVERHEAD_SEC = float(os.getenv("BATCH_OVERHEAD_SEC", "30"))
+BATCH_STARTUP_SEC = float(os.getenv("BATCH_STARTUP_SEC", "180"))
+
+# Sharding: jobs bound for SHARD_QUEUES that are predicted to run longer than the target are split
+# into row ranges of about SHARD_TARGET_RUNTIME_SEC each and gathered from job-results
+SHARD_QUEUES = [q.strip() for q in os.getenv("SHARD_QUEUES", "spark-jobs").split(",") if q.strip()]
+SHARD_TARGET_RUNTIME_SEC = float(os.getenv("SHARD_TARGET_RUNTIME_SEC", "60"))
+SHARD_MIN_ROWS = int(os.getenv("SHARD_MIN_ROWS", "1000000"))
+SHARD_MAX_COUNT = int(os.getenv("SHARD_MAX_COUNT", "10"))
+# A shard that has not reported by then is sent again, up to SHARD_MAX_ATTEMPTS sends in all
+SHARD_TIMEOUT_SEC = float(os.getenv("SHARD_TIMEOUT_SEC", "1800"))
+SHARD_MAX_ATTEMPTS = int(os.getenv("SHARD_MAX_ATTEMPTS", "3"))
+SHARD_CHECK_INTERVAL = float(os.getenv("SHARD_CHECK_INTERVAL", "10"))
+SHARD_TRACKER_BACKEND = os.getenv("SHARD_TRACKER_BACKEND", "local")
+
+# Fusion: tiny jobs (predicted runtime up to FUSE_MAX_RUNTIME_SEC, not latency-sensitive) bound for
+# one of FUSE_QUEUES are sent together as fused messages of up to FUSE_MAX_JOBS jobs / FUSE_MAX_BYTES,
+# each held at most FUSE_MAX_DELAY_MS; high-priority lanes are never fused
+FUSE_QUEUES = [q.strip() for q in os.getenv("FUSE_QUEUES", "").split(",") if q.strip()]
+FUSE_MAX_RUNTIME_SEC = float(os.getenv("FUSE_MAX_RUNTIME_SEC", "2"))
+FUSE_MAX_JOBS = int(os.getenv("FUSE_MAX_JOBS", "50"))
+FUSE_MAX_BYTES = int(os.getenv("FUSE_MAX_BYTES", "200000"))
+FUSE_MAX_DELAY_MS = float(os.getenv("FUSE_MAX_DELAY_MS", "100"))
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8005"))
+
+# Deliveries of a message that retry Batch after an ambiguous failure before falling back to AKS
+BATCH_SUBMIT_ATTEMPTS = int(os.getenv("BATCH_SUBMIT_ATTEMPTS", "3"))
+
+# Logs are exported to stdout and Application Insights from a background thread;
+# per-job lines are sampled (JOB_LOG_SAMPLE_RATE)
+telemetry = Telemetry("SCHEDULER", APPINSIGHTS_CONNECTION_STRING)
+logger = telemetry.logger
+
+# Prometheus metrics
+jobs_routed = Counter('scheduler_jobs_routed_total', 'Jobs handed to their execution target', ['platform', 'target'])
+batch_fallbacks = Counter('scheduler_batch_fallbacks_total', 'Batch submissions that failed and went to AKS instead')
+messages_settled = Counter('scheduler_messages_total', 'jobqueue messages settled', ['outcome'])
+classification_duration = Histogram('scheduler_classification_duration_seconds',
+                                    'Time to classify and route one job', buckets=LATENCY_BUCKETS)
+scheduling_queue_wait = Histogram('scheduler_queue_wait_seconds', 'Time from submission to pickup from jobqueue',
+                                  buckets=DURATION_BUCKETS)
+jobs_sharded = Counter('scheduler_jobs_sharded_total', 'Jobs split into shards')
+shards_sent = Counter('scheduler_shards_sent_total', 'Shard messages sent', ['reason'])
+sharded_jobs_finished = Counter('scheduler_sharded_jobs_finished_total', 'Sharded jobs gathered', ['state'])
+fused_message_jobs = Histogram('scheduler_fused_message_jobs', 'Jobs carried by each fused message',
+                               buckets=(1, 2, 5, 10, 20, 50, 100, 200))
+sharded_job_duration = Histogram('scheduler_sharded_job_duration_seconds',
+                                 'Time from splitting a job to its last shard reporting', buckets=DURATION_BUCKETS)
 
 # Initialize Batch submitter (optional - only if Batch is configured)
 batch_submitter = None
 if BATCH_ACCOUNT_NAME and BATCH_ACCOUNT_KEY and BATCH_ACCOUNT_URL:
     try:
+        from batch_submitter import BatchJobSubmitter
+
         batch_submitter = BatchJobSubmitter(
             BATCH_ACCOUNT_NAME, 
             BATCH_ACCOUNT_KEY, 
@@ -42,33 +117,87 @@ if BATCH_ACCOUNT_NAME and BATCH_ACCOUNT_KEY and BATCH_ACCOUNT_URL:
     except Exception as e:
         print(f"[SCHEDULER] Azure Batch not available: {e}", flush=True)
 
-def connect_with_retry():
-    """Connect to Service Bus with retries"""
-    for attempt in range(MAX_RETRIES):
-        try:
-            print(f"[SCHEDULER] Attempting to connect to Service Bus (attempt {attempt + 1}/{MAX_RETRIES})...", flush=True)
-            client = ServiceBusClient.from_connection_string(SERVICEBUS_CONNECTION_STRING)
-            print("[SCHEDULER] Successfully connected to Service Bus", flush=True)
-            return client
-        except Exception as e:
-            print(f"[SCHEDULER] Connection failed: {e}", flush=True)
-            if attempt < MAX_RETRIES - 1:
-                print(f"[SCHEDULER] Retrying in {RETRY_DELAY} seconds...", flush=True)
-                time.sleep(RETRY_DELAY)
-            else:
-                print("[SCHEDULER] Max retries reached. Exiting.", flush=True)
-                sys.exit(1)
+cost_model = CostModel(min_samples=COST_MODEL_MIN_SAMPLES)
+if COST_MODEL_PATH and os.path.exists(COST_MODEL_PATH):
+    try:
+        cost_model.load(COST_MODEL_PATH)
+        print(f"[SCHEDULER] Loaded cost model ({cost_model.samples} samples)", flush=True)
+    except Exception as e:
+        print(f"[SCHEDULER] Could not load cost model: {e}", flush=True)
 
-def estimate_cost(job: dict):
-    p = job["payload"]
+placement = Placement(batch_overhead_sec=BATCH_OVERHEAD_SEC, batch_startup_sec=BATCH_STARTUP_SEC)
+
+# Job ids already routed, so redelivered messages are settled without routing them again.
+# Routing takes milliseconds, so a claim left by a crashed scheduler only needs to block briefly.
+dedup = create_dedup_store(claim_ttl=60)
 
-    cpu_cost = p.get("rows", 1000) / 1_000_000
-    time_cost = p.get("estimated_runtime_sec", 10) / 60
+# Outstanding shards of split jobs; use the redis backend with more than one scheduler replica
+shard_tracker = create_shard_tracker(SHARD_TRACKER_BACKEND)
+shards_checked_at = 0.0
 
-    priority_weight = 2 if p.get("priority") == "high" else 1
+fuser = Fuser(FUSE_MAX_JOBS, FUSE_MAX_BYTES, FUSE_MAX_DELAY_MS / 1000)
 
-    total_score = (cpu_cost + time_cost) * priority_weight
-    return total_score
+# Started in main(); classify only ever reads their cached snapshots
+queue_monitor = None
+batch_pool = None
+batch_client = None
+status_emitter = None
+
+def fetch_batch_pool_state() -> dict:
+    """Node counts of the Batch pool (all pools if BATCH_POOL_ID is unset)"""
+    from azure.batch import BatchServiceClient
+    from azure.batch.batch_auth import SharedKeyCredentials
+
+    global batch_client
+    if batch_client is None:
+        credentials = SharedKeyCredentials(BATCH_ACCOUNT_NAME, BATCH_ACCOUNT_KEY)
+        batch_client = BatchServiceClient(credentials, batch_url=BATCH_ACCOUNT_URL)
+    state = {"idle": 0, "running": 0, "total": 0}
+    for pool in batch_client.account.list_pool_node_counts():
+        if BATCH_POOL_ID and pool.pool_id != BATCH_POOL_ID:
+            continue
+        for counts in (pool.dedicated, pool.low_priority):
+            if counts:
+                state["idle"] += counts.idle
+                state["running"] += counts.running
+                state["total"] += counts.total
+    return state
+
+def predicted_runtime(payload: dict) -> float:
+    if COST_MODEL == "static":
+        return payload.get("estimated_runtime_sec", 10)
+    return cost_model.predict_runtime(payload)
+
+def estimate_cost(job: dict):
+    return static_cost(job["payload"], predicted_runtime(job["payload"]))
+
+def record_results(broker):
+    """Train the cost model on the durations workers reported since the last call"""
+    msgs = broker.receive_batch(RESULTS_QUEUE, max_count=100, max_wait=fusion_wait(RESULTS_MAX_WAIT))
+    if not msgs:
+        return
+    history = open(JOB_HISTORY_PATH, "a") if JOB_HISTORY_PATH else None
+    try:
+        for msg in msgs:
+            try:
+                result = json.loads(str(msg))
+                cost_model.update(result["payload"], float(result["duration"]))
+                placement.record_completion(result.get("job_type"), result.get("completed_at") or time.time())
+                gather(result)
+                if history:
+                    history.write(json.dumps(result) + "\n")
+            except Exception as e:
+                print(f"[SCHEDULER] Ignoring malformed job result: {e}", flush=True)
+            broker.complete(msg)
+    finally:
+        if history:
+            history.close()
+
+    if COST_MODEL_PATH and cost_model.samples % SAVE_EVERY < len(msgs):
+        try:
+            cost_model.save(COST_MODEL_PATH)
+        except Exception as e:
+            print(f"[SCHEDULER] Could not save cost model: {e}", flush=True)
 
 def classify(job: dict) -> tuple:
     
@@ -79,92 +208,352 @@ def classify(job: dict) -> tuple:
     if p.get("latency_sensitive") == True:
         return ("aks", "actor-jobs")
 
-    # Heavy compute jobs go to Azure Batch if available
-    if batch_submitter and score > 10:
-        return ("batch", "spark")
-    elif batch_submitter and score > 4:
-        return ("batch", "ml")
-    
-    # Fallback to AKS queues if Batch not configured
     if score > 10:
-        return ("aks", "spark-jobs")
+        tier = "spark"
     elif score > 4:
-        return ("aks", "ml-jobs")
+        tier = "ml"
     else:
         return ("aks", "actor-jobs")
+    
+    # Fallback to AKS queues if Batch not configured
+    if not batch_submitter:
+        return ("aks", f"{tier}-jobs")
+    if ROUTING_POLICY == "static" or queue_monitor is None:
+        return ("batch", tier)
+    
+    # Heavy compute jobs go wherever they are expected to finish first
+    placement.observe_snapshot(queue_monitor.updated_at)
+    depth = queue_monitor.depth(*lane_queues(f"{tier}-jobs"))
+    platform = placement.choose(tier, depth, predicted_runtime(p), batch_pool.value, time.time())
+    if platform == "batch":
+        return ("batch", tier)
+    return ("aks", f"{tier}-jobs")
+
+def batch_error_code(error):
+    """Error code of a response from the Batch service, None when no response came back"""
+    from azure.batch.models import BatchErrorException
+
+    if isinstance(error, BatchErrorException):
+        return getattr(error.error, "code", None) or "unknown"
+    return None
 
-def route_job(client, job: dict, platform: str, target: str):
+def route_job(job: dict, platform: str, target: str, attempt: int = 1):
+    """Hand Batch jobs to Azure Batch; return the AKS queue the job must be sent to, if any"""
     job_id = job.get('job_id', 'unknown')
     
-    if platform == "batch":
-        # Submit to Azure Batch
+    if platform != "batch":
+        return target
+    
+    # Submit to Azure Batch with its own copy of the data, so a claim-checked blob can go once it is there
+    try:
+        result = batch_submitter.submit_job(job_id, {**job["payload"], "data": job_data(job)}, target)
+        discard_data(job)
+        placement.record_batch(predicted_runtime(job["payload"]), time.time())
+        status_emitter.emit(job_id, SCHEDULED, platform="batch", target=target)
+        jobs_routed.labels(platform="batch", target=target).inc()
+        telemetry.job(job_id, "Routed job to Azure Batch (%s): %s", target, job_id,
+                      platform='batch', job_type=target, batch_job_id=result.get('batch_job_id'))
+        return None
+    except Exception as e:
+        code = batch_error_code(e)
+        if code in ("JobExists", "TaskExists"):
+            # An earlier attempt reached Batch even though it reported a failure
+            telemetry.job(job_id, "Job already in Azure Batch (%s): %s", target, job_id)
+            discard_data(job)
+            return None
+        if code is None and attempt < BATCH_SUBMIT_ATTEMPTS:
+            # No answer from Batch: the job may exist, so retry Batch on redelivery instead of
+            # also running it on AKS
+            raise
+        # Fallback to AKS if Batch fails
+        batch_fallbacks.inc()
+        logger.warning("Batch submission failed for %s, falling back to AKS: %s", job_id, e)
+        return f"{target}-jobs"
+
+def send_to_queue(broker, target: str, entries: list):
+    """Send every job bound for one AKS queue lane as a single grouped batch.
+
+    ``entries`` are (received message, job, trace). The received body is
+    forwarded as is, so job data is never re-encoded here; each message
+    carries its job's trace on to the worker, next to the lane stamp.
+    """
+    broker.send_batch(target, [lane_message(msg, job, trace) for msg, job, trace in entries])
+    record_routed(target, [job for _, job, _ in entries])
+
+def send_fused(broker, target: str, entries: list):
+    """Send the jobs held for one fusing lane as a single fused message; entries as for send_to_queue"""
+    body, properties = encode_fused([lane_message(msg, job, trace) for msg, job, trace in entries])
+    broker.send(target, Message(body, properties=properties))
+    fused_message_jobs.observe(len(entries))
+    record_routed(target, [job for _, job, _ in entries])
+
+def lane_message(msg, job: dict, trace: dict) -> Message:
+    return Message(
+        msg.body,
+        properties={**encoding_properties(msg), **trace, **lane_properties(job_priority(job))},
+        message_id=job.get("job_id")
+    )
+
+def record_routed(target: str, jobs: list):
+    jobs_routed.labels(platform="aks", target=target).inc(len(jobs))
+    for job in jobs:
+        job_id = job.get('job_id', 'unknown')
+        status_emitter.emit(job.get("job_id"), SCHEDULED, platform="aks", target=target)
+        telemetry.job(job_id, "Routed job to AKS %s: %s", target, job_id, platform='aks', queue=target)
+
+def split_job(msg, job: dict, queue: str, trace: dict) -> list:
+    """(message, job) pairs to send for a job bound for an AKS queue: the job itself, or its shards.
+
+    A large job is split into row ranges that each run for about
+    SHARD_TARGET_RUNTIME_SEC. The shards are registered with the tracker
+    before they are sent, so results can never arrive for an unknown parent.
+    """
+    payload = job["payload"]
+    if queue not in SHARD_QUEUES or shard_info(job):
+        return [(msg, job)]
+    ranges = plan_shards(int(payload.get("rows") or 0), predicted_runtime(payload),
+                         SHARD_TARGET_RUNTIME_SEC, SHARD_MAX_COUNT, SHARD_MIN_ROWS)
+    if not ranges:
+        return [(msg, job)]
+
+    shards = [shard_job(job, index, ranges) for index in range(len(ranges))]
+    messages = []
+    for shard in shards:
+        body, properties = repack_job(shard)
+        if trace.get(TRACE_ID):
+            properties[TRACE_ID] = trace[TRACE_ID]
+        messages.append(Message(body, properties=properties, message_id=shard["job_id"]))
+    parent = {
+        "job_id": job["job_id"],
+        "queue": lane_queue(queue, job_priority(job)),
+        "priority": job_priority(job),
+        "count": len(shards),
+        "split_at": time.time(),
+        "data_ref": data_ref(job),
+    }
+    shard_tracker.register(job["job_id"], parent, [(m.body, m.properties) for m in messages],
+                           time.time() + SHARD_TIMEOUT_SEC)
+    telemetry.job(job["job_id"], "Split job %s into %d shards of ~%d rows", job["job_id"], len(shards),
+                  ranges[0][1] - ranges[0][0], shards=len(shards))
+    return list(zip(messages, shards))
+
+def finish_sharded_job(parent: dict, state: str, **fields):
+    """Report a gathered parent and drop the data its shards shared"""
+    duration = time.time() - parent["split_at"]
+    status_emitter.emit(parent["job_id"], state, shards=parent["count"], duration=duration, **fields)
+    sharded_jobs_finished.labels(state=state).inc()
+    sharded_job_duration.observe(duration)
+    discard_ref(parent.get("data_ref"))
+    telemetry.job(parent["job_id"], "Sharded job %s %s after %.1fs", parent["job_id"], state, duration)
+
+def gather(result: dict):
+    """Count a shard's result towards its parent; the last one completes the parent"""
+    shard = shard_info(result)
+    if not shard:
+        return
+    parent = shard_tracker.report(shard["parent_id"], shard["index"])
+    if parent is not None:
+        finish_sharded_job(parent, JOB_DONE)
+
+def resend_expired_shards(broker):
+    """Send shards that have not reported within SHARD_TIMEOUT_SEC again, failing parents out of attempts.
+
+    Shards that fail on a worker are retried by the worker on their own;
+    this catches the ones that never come back, e.g. quarantined ones.
+    """
+    now = time.time()
+    for parent_id, index, attempts, parent, body, properties in shard_tracker.expired(now, now + SHARD_TIMEOUT_SEC):
+        if attempts > SHARD_MAX_ATTEMPTS:
+            parent = shard_tracker.abort(parent_id)
+            if parent is not None:
+                logger.error("Sharded job %s failed: shard %d did not report after %d sends",
+                             parent_id, index, SHARD_MAX_ATTEMPTS)
+                finish_sharded_job(parent, FAILED, error=f"shard {index} did not complete")
+            continue
         try:
-            result = batch_submitter.submit_job(job_id, job["payload"], target)
-            print(f"[SCHEDULER] Routed job to Azure Batch ({target}): {job_id}", flush=True)
-            
-            if logger:
-                logger.info(f"Job routed to Batch: {job_id}", extra={
-                    'custom_dimensions': {
-                        'job_id': job_id,
-                        'platform': 'batch',
-                        'job_type': target,
-                        'batch_job_id': result.get('batch_job_id')
-                    }
-                })
+            # The first send used the shard id, which duplicate detection would drop
+            original = Message(body, properties={**properties, **lane_properties(parent["priority"])},
+                               message_id=shard_id(parent_id, index))
+            broker.send(parent["queue"], resent_message(original, "resend", count=attempts - 1))
         except Exception as e:
-            print(f"[SCHEDULER] Batch submission failed, falling back to AKS: {e}", flush=True)
-            # Fallback to AKS if Batch fails
-            fallback_queue = f"{target}-jobs"
-            sender = client.get_queue_sender(queue_name=fallback_queue)
-            with sender:
-                message = ServiceBusMessage(json.dumps(job))
-                sender.send_messages(message)
-            print(f"[SCHEDULER] Fallback: Routed job to AKS {fallback_queue}: {job_id}", flush=True)
-    else:
-        # Submit to AKS via Service Bus queue
-        sender = client.get_queue_sender(queue_name=target)
-        with sender:
-            message = ServiceBusMessage(json.dumps(job))
-            sender.send_messages(message)
-        print(f"[SCHEDULER] Routed job to AKS {target}: {job_id}", flush=True)
-        
-        if logger:
-            logger.info(f"Job routed to AKS: {job_id}", extra={
-                'custom_dimensions': {
-                    'job_id': job_id,
-                    'platform': 'aks',
-                    'queue': target
-                }
-            })
-
-def process_message(client, msg):
+            # The shard stays claimed until its new deadline, so it is retried on a later check
+            logger.error("Could not resend shard %d of %s: %s", index, parent_id, e)
+            continue
+        shards_sent.labels(reason="resend").inc()
+        logger.warning("Resent shard %d of %s (send %d of %d)", index, parent_id, attempts, SHARD_MAX_ATTEMPTS)
+
+def process_message(msg):
+    """Classify one message.
+
+    Returns the job, the AKS queue still to send to, its trace and the
+    (message, job) pairs to send there: the job itself or its shards.
+    """
     start_time = time.time()
-    job = json.loads(str(msg))
+    job = decode_job(msg)
     job_id = job.get('job_id', 'unknown')
-    print(f"[SCHEDULER] Scheduling job: {job_id}", flush=True)
+    trace = {**carry(msg), PICKED_AT: start_time}
     
-    # Classify and route the job
-    platform, target = classify(job)
-    cost = estimate_cost(job)
-    print(f"[SCHEDULER] Classification: {platform}/{target} (score: {cost:.2f})", flush=True)
+    state = dedup.claim(f"route:{job_id}")
+    if state == DONE:
+        telemetry.job(job_id, "Skipping duplicate of already routed job: %s", job_id)
+        return job, None, trace, None
+    if state != CLAIMED:
+        raise RuntimeError(f"job {job_id} is being routed by another attempt")
     
-    route_job(client, job, platform, target)
+    # Classify and route the job
+    try:
+        platform, target = classify(job)
+        cost = estimate_cost(job)
+        
+        # Retries arrive as new messages, so their earlier attempts are counted from the retry properties
+        queue = route_job(job, platform, target, attempt=failed_attempts(msg) + max(msg.delivery_count, 1))
+        outgoing = split_job(msg, job, queue, trace) if queue is not None else None
+    except Exception:
+        dedup.release(f"route:{job_id}")
+        raise
+    if queue is not None:
+        placement.record_aks(queue[:-len("-jobs")])
     
     duration = time.time() - start_time
-    if logger:
-        logger.info(f"Job scheduled: {job_id}", extra={
-            'custom_dimensions': {
-                'job_id': job_id,
-                'platform': platform,
-                'target': target,
-                'cost_score': cost,
-                'duration_ms': duration * 1000
-            }
-        })
+    submitted_at = trace.get(SUBMITTED_AT)
+    classification_duration.observe(duration)
+    if submitted_at:
+        scheduling_queue_wait.observe(max(0.0, start_time - float(submitted_at)))
+    telemetry.job(
+        job_id, "Scheduled job %s: %s/%s (score: %.2f)", job_id, platform, target, cost,
+        trace_id=trace.get(TRACE_ID),
+        platform=platform,
+        target=target,
+        cost_score=cost,
+        queue_wait_ms=(start_time - float(submitted_at)) * 1000 if submitted_at else None,
+        duration_ms=duration * 1000
+    )
+    return job, queue, trace, outgoing
+
+def fusible(lane: str, job: dict, outgoing: list) -> bool:
+    """Tiny, latency-tolerant jobs bound for a fusing lane"""
+    payload = job["payload"]
+    return (lane in FUSE_QUEUES and len(outgoing) == 1 and not payload.get("latency_sensitive")
+            and predicted_runtime(payload) <= FUSE_MAX_RUNTIME_SEC)
+
+def send_groups(broker, groups, send, completed: list, failed: list):
+    """Send (lane, entries) groups with ``send``, sorting the messages they came from for settlement"""
+    for queue, entries in groups:
+        try:
+            send(broker, queue, [
+                (out_msg, out_job, trace) for _, _, trace, outgoing in entries for out_msg, out_job in outgoing
+            ])
+        except Exception as e:
+            logger.error("Failed to send %d job(s) to %s: %s", len(entries), queue, e)
+            for msg, job, _, _ in entries:
+                dedup.release(f"route:{job.get('job_id', 'unknown')}")
+                failed.append((msg, e))
+        else:
+            for msg, job, _, outgoing in entries:
+                if len(outgoing) > 1:
+                    jobs_sharded.inc()
+                    shards_sent.labels(reason="split").inc(len(outgoing))
+                    status_emitter.emit(job.get("job_id"), SCHEDULED, platform="aks", target=queue, shards=len(outgoing))
+                dedup.complete(f"route:{job.get('job_id', 'unknown')}")
+                completed.append(msg)
+
+def settle(broker, completed: list, failed: list):
+    """Complete routed messages; ``failed`` (message, error) pairs are retried after a backoff or quarantined"""
+    for msg in completed:
+        broker.complete(msg)
+    messages_settled.labels(outcome="completed").inc(len(completed))
+    for msg, error in failed:
+        try:
+            outcome = settle_failed(broker, msg, error)
+        except Exception as e:
+            logger.error("Could not schedule a retry of %s, abandoning it: %s", msg.message_id, e)
+            broker.abandon(msg)
+            outcome = "abandoned"
+        if outcome == QUARANTINED:
+            logger.warning("Quarantined job %s: %s", original_id(msg), error)
+            status_emitter.emit(original_id(msg), QUARANTINED, target="jobqueue", error=str(error)[:500])
+        messages_settled.labels(outcome=outcome).inc()
+
+def flush_fused(broker, groups: list):
+    """Send held groups as fused messages and settle the messages they came from"""
+    completed = []
+    failed = []
+    send_groups(broker, groups, send_fused, completed, failed)
+    settle(broker, completed, failed)
+
+def process_batch(broker, executor, msgs):
+    """Route a received batch concurrently, then settle it on the receiver.
+
+    Classification and Batch submissions run on the executor; every job
+    bound for the same AKS queue lane is then sent in one grouped batch from
+    this thread, through the broker's long-lived sender for that queue.
+
+    Ordering: jobs within one batch are routed in parallel, so they may reach
+    their target queues in any order; batches themselves are handled one
+    after another. Settlement happens on this thread only, because broker
+    receivers are not thread-safe, and only after every job in the batch has
+    been routed, so a crash mid-batch redelivers the unsettled messages.
+
+    Jobs that can be fused are held in ``fuser`` instead; the messages they
+    came from are settled when their fused message goes out.
+    """
+    futures = [(msg, executor.submit(process_message, msg)) for msg in msgs]
+    completed = []
+    failed = []
+    groups = {}
+    full = []
+
+    for msg, future in futures:
+        try:
+            job, queue, trace, outgoing = future.result()
+        except Exception as e:
+            logger.error("Error processing message: %s", e)
+            failed.append((msg, e))
+            continue
+        if queue is None:
+            dedup.complete(f"route:{job.get('job_id', 'unknown')}")
+            completed.append(msg)
+        else:
+            # High-priority jobs go to the queue's -high lane so they skip the normal backlog
+            lane = lane_queue(queue, job_priority(job))
+            entry = (msg, job, trace, outgoing)
+            if fusible(lane, job, outgoing):
+                full += fuser.add(lane, entry, len(msg.body) + MEMBER_OVERHEAD, time.time())
+            else:
+                groups.setdefault(lane, []).append(entry)
+
+    send_groups(broker, groups.items(), send_to_queue, completed, failed)
+    send_groups(broker, full, send_fused, completed, failed)
+    settle(broker, completed, failed)
+
+def fusion_wait(max_wait: float) -> float:
+    """``max_wait`` cut short so held jobs are sent within FUSE_MAX_DELAY_MS; every blocking receive uses it"""
+    due = fuser.next_due()
+    if due is None:
+        return max_wait
+    return max(0.01, min(max_wait, due - time.time()))
+
+def schedule_once(broker, executor, max_wait: float = 5):
+    """One turn of the scheduler loop: route a batch from jobqueue, then learn from new results"""
+    global shards_checked_at
+    received_msgs = broker.receive_batch("jobqueue", max_count=SCHEDULER_BATCH_SIZE, max_wait=fusion_wait(max_wait))
+    if received_msgs:
+        process_batch(broker, executor, received_msgs)
+    flush_fused(broker, fuser.due(time.time()))
+    record_results(broker)
+    # Held jobs may have fallen due while results were read
+    flush_fused(broker, fuser.due(time.time()))
+    if time.time() - shards_checked_at >= SHARD_CHECK_INTERVAL:
+        shards_checked_at = time.time()
+        try:
+            resend_expired_shards(broker)
+        except Exception as e:
+            logger.error("Shard timeout check failed: %s", e)
 
 def main():
+    global queue_monitor, batch_pool, status_emitter
     print("[SCHEDULER] Starting scheduler...", flush=True)
-    print(f"[SCHEDULER] Service Bus connection configured", flush=True)
+    start_metrics_server("SCHEDULER", METRICS_PORT)
     
     if batch_submitter:
         print("[SCHEDULER] Azure Batch integration: ENABLED", flush=True)
@@ -173,27 +562,35 @@ def main():
         print("[SCHEDULER] Azure Batch integration: DISABLED", flush=True)
         print("[SCHEDULER] All jobs will be sent to AKS queues", flush=True)
     
-    client = connect_with_retry()
+    broker = connect_with_retry("SCHEDULER", prefetch=SCHEDULER_PREFETCH)
+    status_emitter = StatusEmitter(broker)
+    
+    if batch_submitter and ROUTING_POLICY != "static":
+        queues = [queue for tier in ("ml", "spark") for queue in lane_queues(f"{tier}-jobs")]
+        queue_monitor = QueueMonitor(
+            lambda: connect_with_retry("SCHEDULER"),
+            queues,
+            interval=STATE_REFRESH_INTERVAL,
+            name="SCHEDULER"
+        )
+        batch_pool = Refresher("SCHEDULER", fetch_batch_pool_state, interval=STATE_REFRESH_INTERVAL)
+        queue_monitor.start()
+        batch_pool.start()
+        print(f"[SCHEDULER] Load-aware routing between AKS and Batch (refresh every {STATE_REFRESH_INTERVAL}s)", flush=True)
     
-    receiver = client.get_queue_receiver(queue_name="jobqueue", max_wait_time=5)
+    executor = ThreadPoolExecutor(max_workers=SCHEDULER_CONCURRENCY)
     
-    print("[SCHEDULER] Listening for jobs...", flush=True)
+    print(f"[SCHEDULER] Listening for jobs (batch size {SCHEDULER_BATCH_SIZE}, concurrency {SCHEDULER_CONCURRENCY})...", flush=True)
     try:
-        with receiver:
-            while True:
-                received_msgs = receiver.receive_messages(max_message_count=1, max_wait_time=5)
-                for msg in received_msgs:
-                    try:
-                        process_message(client, msg)
-                        receiver.complete_message(msg)
-                    except Exception as e:
-                        print(f"[SCHEDULER] Error processing message: {e}", flush=True)
-                        if logger:
-                            logger.error(f"Scheduling error: {str(e)}")
-                        receiver.abandon_message(msg)
+        while True:
+            schedule_once(broker, executor)
     except KeyboardInterrupt:
         print("[SCHEDULER] Shutting down gracefully...", flush=True)
-        client.close()
+        executor.shutdown(wait=True)
+        flush_fused(broker, fuser.drain())
+        status_emitter.close()
+        broker.close()
+        telemetry.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,87 @@
+"""Load-aware choice between an AKS worker queue and Azure Batch.
+
+For a job of a given tier, ``Placement.choose`` estimates when it would
+finish on each destination and picks the earliest:
+
+- AKS: the queue's cached depth plus jobs routed there since that snapshot,
+  drained at the tier's measured completion rate (from job-results), then
+  the job's own runtime.
+- Batch: a fixed scheduling overhead, a wait for a node (node startup when
+  the pool has no ready nodes, otherwise the backlog of our own submissions
+  spread over the ready nodes), then the runtime.
+
+Kept free of broker and Azure imports so ``scripts/simulate_routing.py``
+can drive the same decisions.
+"""
+import collections
+import heapq
+import threading
+
+
+class Placement:
+    def __init__(self, window_sec: float = 60, batch_overhead_sec: float = 30,
+                 batch_startup_sec: float = 180):
+        self.window_sec = window_sec
+        self.batch_overhead_sec = batch_overhead_sec
+        self.batch_startup_sec = batch_startup_sec
+        self.completions = collections.defaultdict(collections.deque)
+        self.routed_since_snapshot = collections.Counter()
+        self.snapshot_at = None
+        self.batch_finishes = []
+        self._lock = threading.Lock()
+
+    def record_completion(self, tier: str, now: float):
+        """A worker of this tier finished a job (reported on job-results)"""
+        with self._lock:
+            self.completions[tier].append(now)
+
+    def observe_snapshot(self, updated_at: float):
+        """A fresh depth snapshot already counts everything routed before it"""
+        with self._lock:
+            if updated_at is not None and updated_at != self.snapshot_at:
+                self.snapshot_at = updated_at
+                self.routed_since_snapshot.clear()
+
+    def record_aks(self, tier: str):
+        with self._lock:
+            self.routed_since_snapshot[tier] += 1
+
+    def record_batch(self, runtime: float, now: float):
+        with self._lock:
+            heapq.heappush(self.batch_finishes, now + self.batch_overhead_sec + runtime)
+
+    def drain_rate(self, tier: str, now: float) -> float:
+        with self._lock:
+            done = self.completions[tier]
+            while done and now - done[0] > self.window_sec:
+                done.popleft()
+            return len(done) / self.window_sec
+
+    def aks_completion_time(self, tier: str, depth: int, runtime: float, now: float) -> float:
+        rate = self.drain_rate(tier, now)
+        with self._lock:
+            backlog = depth + self.routed_since_snapshot[tier]
+        if rate <= 0:
+            # No completions seen lately: assume a single slot works through the backlog
+            rate = 1.0 / max(runtime, 1e-3)
+        return backlog / rate + runtime
+
+    def batch_completion_time(self, pool: dict, runtime: float, now: float) -> float:
+        with self._lock:
+            while self.batch_finishes and self.batch_finishes[0] <= now:
+                heapq.heappop(self.batch_finishes)
+            outstanding = len(self.batch_finishes)
+        ready = (pool or {}).get("idle", 0) + (pool or {}).get("running", 0)
+        if pool is None:
+            wait = 0.0  # pool state unknown; assume a free node
+        elif ready == 0:
+            wait = self.batch_startup_sec
+        else:
+            wait = max(0, outstanding + 1 - ready) * runtime / ready
+        return self.batch_overhead_sec + wait + runtime
+
+    def choose(self, tier: str, depth: int, runtime: float, pool: dict, now: float) -> str:
+        """'aks' or 'batch', whichever is expected to finish the job first"""
+        aks = self.aks_completion_time(tier, depth, runtime, now)
+        batch = self.batch_completion_time(pool, runtime, now)
+        return "batch" if batch < aks else "aks"
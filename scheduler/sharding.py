@@ -0,0 +1,229 @@
+"""Scatter/gather of large row-based jobs.
+
+``plan_shards`` splits a job's rows into contiguous ranges sized so that
+each shard is expected to run for about the target runtime, and
+``shard_job`` builds the job for one range. A shard keeps its parent's
+payload (and packed data) with ``rows`` and ``estimated_runtime_sec``
+scaled to its range, plus ``payload["shard"]``::
+
+    {"parent_id": ..., "index": 2, "count": 8, "row_start": 12500000, "row_end": 18750000}
+
+The ``ShardTracker`` gathers them: the scheduler registers every shard of
+a parent before sending them, ``report`` marks one done as its result comes
+back on job-results and returns the parent once the last one is in, and
+``expired`` hands back shards that have not reported within the timeout so
+they can be sent again. Each state change happens exactly once even with
+several scheduler replicas sharing the ``redis`` backend.
+
+The backend is picked with ``SHARD_TRACKER_BACKEND``:
+
+- ``local``: in-process; enough for a single scheduler replica
+- ``redis``: the Redis-compatible server at ``REDIS_URL``, shared by all replicas
+"""
+import json
+import math
+import threading
+from dedup import REDIS_URL
+
+SHARD = "shard"
+
+
+def plan_shards(rows: int, runtime_sec: float, target_runtime_sec: float,
+                max_shards: int, min_rows: int) -> list:
+    """(row_start, row_end) ranges for the job; empty when it is not worth splitting"""
+    if rows <= 0 or runtime_sec <= target_runtime_sec:
+        return []
+    count = min(math.ceil(runtime_sec / target_runtime_sec), max_shards, rows // max(min_rows, 1))
+    if count < 2:
+        return []
+    bounds = [rows * i // count for i in range(count + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def shard_id(parent_id: str, index: int) -> str:
+    return f"{parent_id}.shard-{index:03d}"
+
+
+def shard_job(job: dict, index: int, ranges: list) -> dict:
+    """The job for shard ``index`` of ``ranges``, with its id derived from the parent's"""
+    parent_id = job["job_id"]
+    payload = job["payload"]
+    row_start, row_end = ranges[index]
+    fraction = (row_end - row_start) / payload["rows"]
+    shard = {key: value for key, value in job.items() if key not in ("job_id", "payload")}
+    shard["job_id"] = shard_id(parent_id, index)
+    shard["payload"] = {
+        **payload,
+        "rows": row_end - row_start,
+        "estimated_runtime_sec": payload.get("estimated_runtime_sec", 10) * fraction,
+        SHARD: {"parent_id": parent_id, "index": index, "count": len(ranges),
+                "row_start": row_start, "row_end": row_end},
+    }
+    return shard
+
+
+def shard_info(job: dict):
+    """``payload["shard"]`` of a shard job, None for anything else"""
+    return job.get("payload", {}).get(SHARD)
+
+
+class ShardTracker:
+    """Gather state of sharded parents.
+
+    ``parent`` is a JSON-serializable dict kept with the parent and handed
+    back by ``report`` and ``abort``; each shard is stored as the message
+    needed to send it again: (body, properties).
+    """
+
+    def register(self, parent_id: str, parent: dict, shards: list, deadline: float):
+        raise NotImplementedError
+
+    def report(self, parent_id: str, index: int):
+        """Mark a shard done; returns the parent when this was its last outstanding shard"""
+        raise NotImplementedError
+
+    def expired(self, now: float, deadline: float, limit: int = 100) -> list:
+        """Claim shards past their deadline, moving it to ``deadline``.
+
+        Returns (parent_id, index, attempts, parent, body, properties), where
+        ``attempts`` counts the sends including the one about to happen.
+        """
+        raise NotImplementedError
+
+    def abort(self, parent_id: str):
+        """Forget a parent that will not complete; returns it unless another caller already did"""
+        raise NotImplementedError
+
+
+class LocalShardTracker(ShardTracker):
+    def __init__(self):
+        self._parents = {}
+        self._lock = threading.Lock()
+
+    def register(self, parent_id: str, parent: dict, shards: list, deadline: float):
+        with self._lock:
+            # A redelivered parent is split the same way; keep the progress already made
+            self._parents.setdefault(parent_id, {
+                "parent": parent,
+                "pending": {index: {"message": message, "attempts": 1, "deadline": deadline}
+                            for index, message in enumerate(shards)},
+            })
+
+    def report(self, parent_id: str, index: int):
+        with self._lock:
+            state = self._parents.get(parent_id)
+            if state is None or state["pending"].pop(index, None) is None:
+                return None
+            if state["pending"]:
+                return None
+            del self._parents[parent_id]
+            return state["parent"]
+
+    def expired(self, now: float, deadline: float, limit: int = 100) -> list:
+        claimed = []
+        with self._lock:
+            for parent_id, state in self._parents.items():
+                for index, shard in state["pending"].items():
+                    if shard["deadline"] > now:
+                        continue
+                    shard["deadline"] = deadline
+                    shard["attempts"] += 1
+                    claimed.append((parent_id, index, shard["attempts"], state["parent"], *shard["message"]))
+                    if len(claimed) >= limit:
+                        return claimed
+        return claimed
+
+    def abort(self, parent_id: str):
+        with self._lock:
+            state = self._parents.pop(parent_id, None)
+        return state["parent"] if state else None
+
+
+class RedisShardTracker(ShardTracker):
+    """One hash per parent plus a sorted set of shard deadlines; scripts keep each step atomic"""
+
+    # KEYS: parent hash, deadlines; ARGV: index, deadline member
+    REPORT_SCRIPT = """
+    if redis.call('hexists', KEYS[1], 'parent') == 0 then return false end
+    if redis.call('hsetnx', KEYS[1], 'done:' .. ARGV[1], 1) == 0 then return false end
+    redis.call('zrem', KEYS[2], ARGV[2])
+    if redis.call('hincrby', KEYS[1], 'reported', 1) < tonumber(redis.call('hget', KEYS[1], 'count')) then
+        return false
+    end
+    local parent = redis.call('hget', KEYS[1], 'parent')
+    redis.call('del', KEYS[1])
+    return parent
+    """
+
+    # KEYS: deadlines, parent hash; ARGV: deadline member, now, new deadline, index
+    CLAIM_SCRIPT = """
+    local score = redis.call('zscore', KEYS[1], ARGV[1])
+    if not score or tonumber(score) > tonumber(ARGV[2]) then return false end
+    if redis.call('hexists', KEYS[2], 'parent') == 0 then
+        redis.call('zrem', KEYS[1], ARGV[1])
+        return false
+    end
+    redis.call('zadd', KEYS[1], ARGV[3], ARGV[1])
+    local attempts = redis.call('hincrby', KEYS[2], 'attempts:' .. ARGV[4], 1)
+    return {attempts, redis.call('hget', KEYS[2], 'parent'),
+            redis.call('hget', KEYS[2], 'body:' .. ARGV[4]), redis.call('hget', KEYS[2], 'props:' .. ARGV[4])}
+    """
+
+    def __init__(self, url: str, prefix: str = "shards:", ttl: float = 7 * 86400):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.deadlines = prefix + "deadlines"
+        self.ttl = int(ttl)
+
+    def _key(self, parent_id: str) -> str:
+        return self.prefix + parent_id
+
+    def register(self, parent_id: str, parent: dict, shards: list, deadline: float):
+        key = self._key(parent_id)
+        if not self.client.hsetnx(key, "parent", json.dumps(parent)):
+            return
+        fields = {"count": len(shards), "reported": 0}
+        for index, (body, properties) in enumerate(shards):
+            fields[f"body:{index}"] = body
+            fields[f"props:{index}"] = json.dumps(properties)
+            fields[f"attempts:{index}"] = 1
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping=fields)
+        pipe.expire(key, self.ttl)
+        pipe.zadd(self.deadlines, {f"{parent_id}|{index}": deadline for index in range(len(shards))})
+        pipe.execute()
+
+    def report(self, parent_id: str, index: int):
+        parent = self.client.eval(self.REPORT_SCRIPT, 2, self._key(parent_id), self.deadlines,
+                                  index, f"{parent_id}|{index}")
+        return json.loads(parent) if parent else None
+
+    def expired(self, now: float, deadline: float, limit: int = 100) -> list:
+        claimed = []
+        for member in self.client.zrangebyscore(self.deadlines, "-inf", now, start=0, num=limit):
+            parent_id, _, index = member.decode("utf-8").rpartition("|")
+            result = self.client.eval(self.CLAIM_SCRIPT, 2, self.deadlines, self._key(parent_id),
+                                      member, now, deadline, index)
+            if result:
+                attempts, parent, body, properties = result
+                claimed.append((parent_id, int(index), int(attempts), json.loads(parent),
+                                body, json.loads(properties)))
+        return claimed
+
+    def abort(self, parent_id: str):
+        key = self._key(parent_id)
+        parent, count = self.client.hmget(key, "parent", "count")
+        if parent is None or not self.client.delete(key):
+            return None
+        self.client.zrem(self.deadlines, *(f"{parent_id}|{index}" for index in range(int(count))))
+        return json.loads(parent)
+
+
+def create_shard_tracker(backend: str = "local") -> ShardTracker:
+    if backend == "local":
+        return LocalShardTracker()
+    if backend == "redis":
+        return RedisShardTracker(REDIS_URL)
+    raise ValueError(f"Unknown shard tracker backend: {backend}")
@@ -0,0 +1,115 @@
+"""Measure wasted job executions under injected failures, with and without dedup.
+
+Jobs go through the real worker dispatcher on the in-memory broker. Two
+kinds of failure are injected:
+
+- lost locks: a finished job's ``complete`` fails (the lock expired while it
+  ran), so the broker redelivers a job that already ran
+- client retries: a submission is sent twice with the same job id, as when
+  a client retries after a timeout with the same Idempotency-Key
+
+Every handler execution beyond the first for a job id counts as waste.
+
+    python scripts/bench_dedup.py --jobs 2000 --lost-lock 0.1 --resubmit 0.05
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "workers"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+from transport import InMemoryBroker, Message
+from dedup import create_dedup_store
+from concurrency import ConcurrentDispatcher, Lane
+
+
+class LostLockBroker(InMemoryBroker):
+    """Turns a fraction of completions into redeliveries, like an expired peek-lock"""
+
+    def __init__(self, lost_lock: float, seed: int):
+        super().__init__()
+        self.lost_lock = lost_lock
+        self.rng = random.Random(seed)
+
+    def complete(self, msg):
+        if self.rng.random() < self.lost_lock:
+            self.abandon(msg)
+        else:
+            super().complete(msg)
+
+
+def run(backend, args):
+    broker = LostLockBroker(args.lost_lock, args.seed)
+    rng = random.Random(args.seed)
+    sent = 0
+    for i in range(args.jobs):
+        job_id = f"job-{i}"
+        copies = 2 if rng.random() < args.resubmit else 1
+        for _ in range(copies):
+            broker.send("actor-jobs", Message(json.dumps({"job_id": job_id, "payload": {}}), message_id=job_id))
+            sent += 1
+
+    executions = collections.Counter()
+    lock = threading.Lock()
+
+    def handler(job):
+        time.sleep(args.job_ms / 1000)
+        with lock:
+            executions[job["job_id"]] += 1
+
+    dispatcher = ConcurrentDispatcher(
+        broker,
+        [Lane("actor", "actor-jobs", handler, mode="thread")],
+        lambda job_type, job, duration: None,
+        lambda job_type, job, error: None,
+        concurrency=args.concurrency,
+        dedup=create_dedup_store(backend)
+    )
+    start = time.time()
+    while broker.queue_depth("actor-jobs") or dispatcher.in_flight or dispatcher.deferred:
+        dispatcher.run_once()
+    dispatcher.shutdown()
+    elapsed = time.time() - start
+
+    total = sum(executions.values())
+    return {
+        "messages_sent": sent,
+        "unique_jobs": len(executions),
+        "executions": total,
+        "wasted_executions": total - len(executions),
+        "wasted_pct": 100.0 * (total - len(executions)) / max(1, total),
+        "elapsed_sec": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--lost-lock", type=float, default=0.1, help="fraction of completions that fail")
+    parser.add_argument("--resubmit", type=float, default=0.05, help="fraction of jobs submitted twice")
+    parser.add_argument("--job-ms", type=float, default=2, help="handler run time")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {backend: run(backend, args) for backend in ("none", "local")}
+
+    print(f"{'dedup':<8}{'sent':>8}{'unique':>8}{'runs':>8}{'wasted':>8}{'wasted %':>10}{'time s':>8}")
+    for name, r in results.items():
+        print(f"{name:<8}{r['messages_sent']:>8}{r['unique_jobs']:>8}{r['executions']:>8}"
+              f"{r['wasted_executions']:>8}{r['wasted_pct']:>10.2f}{r['elapsed_sec']:>8.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
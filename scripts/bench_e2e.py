@@ -0,0 +1,379 @@
+"""End-to-end throughput and latency benchmark of API, scheduler and workers.
+
+Runs the real components in one process on the in-memory broker:
+
+- the API's ``submit_job`` handler with its ingestion batcher, or plain
+  jobqueue sends with ``--target broker`` to leave the API out
+- ``--schedulers`` scheduler loops (``schedule_once``)
+- ``--workers`` worker dispatchers from the shared runtime, consuming every
+  job type, with handlers replaced by sleeps of
+  ``estimated_runtime_sec * --time-scale``
+
+Jobs arrive by a ``constant``, ``poisson`` or ``bursty`` process at
+``--rate`` per second, or replay a trace of JSON lines
+(``{"at": <seconds from start>, "payload": {...}}``) with ``--trace``.
+``--mix`` sets the share of each job class. The run reports sustained
+throughput, submit latency, per-stage latency percentiles (stages as in
+``common/tracing.py``) and the process's CPU and memory use. ``--json``
+stores the results. ``--baseline`` compares them against an earlier run
+and exits with status 1 when throughput or a p99 regressed by more than
+``--tolerance``.
+
+    python scripts/bench_e2e.py --rate 200 --duration 20 --json results.json
+    python scripts/bench_e2e.py --rate 200 --duration 20 --baseline results.json
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+for directory in ("workers", "scheduler", "api", "common"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+# Every component shares one in-memory broker; keep per-job logging out of the measurement
+os.environ.setdefault("BROKER_BACKEND", "memory")
+os.environ.setdefault("JOB_STORE_BACKEND", "memory")
+os.environ.setdefault("DEDUP_BACKEND", "local")
+os.environ.setdefault("PAYLOAD_STORE_BACKEND", "memory")
+os.environ.setdefault("COST_MODEL", "static")
+os.environ.setdefault("WORKER_MODE", "thread")
+os.environ.setdefault("JOB_LOG_SAMPLE_RATE", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from transport import Message, create_broker
+from job_status import StatusEmitter
+from telemetry import Telemetry
+from envelope import decode_job, encode_job, payload_store
+from tracing import FINISHED_AT, STAGES, STARTED_AT, new_trace, stage_durations
+import handlers
+import runtime
+
+# Payloads the static cost formula puts in each class (actor < 4 < ml < 10 < spark);
+# tiny jobs are actor jobs short enough to be fused (FUSE_QUEUES=actor-jobs)
+JOB_CLASSES = {
+    "tiny": {"rows": 100, "estimated_runtime_sec": 1},
+    "actor": {"rows": 1000, "estimated_runtime_sec": 10},
+    "ml": {"rows": 5_000_000, "estimated_runtime_sec": 60},
+    "spark": {"rows": 20_000_000, "estimated_runtime_sec": 120},
+}
+
+
+def load_module(name: str, path: str):
+    """Import a component's main.py under its own name (they are all called main)"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse_mix(spec: str) -> list:
+    mix = []
+    for entry in spec.split(","):
+        job_class, _, share = entry.partition("=")
+        if job_class not in JOB_CLASSES:
+            raise ValueError(f"Unknown job class '{job_class}'")
+        mix.append((job_class, float(share or 1)))
+    return mix
+
+
+def arrivals(args, rng) -> list:
+    """(offset in seconds, payload) of every job to submit"""
+    if args.trace:
+        with open(args.trace) as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        return sorted((float(item["at"]), item["payload"]) for item in items)
+
+    classes, weights = zip(*parse_mix(args.mix))
+    times = []
+    t = 0.0
+    while True:
+        if args.arrival == "constant":
+            t += 1 / args.rate
+        elif args.arrival == "poisson":
+            t += rng.expovariate(args.rate)
+        else:
+            # On/off: --burst-factor times the rate for the first --burst-sec of every --burst-period,
+            # quiet enough in between that the mean stays --rate
+            on = args.burst_sec / args.burst_period
+            high = args.rate * args.burst_factor
+            low = max(1e-9, args.rate * (1 - on * args.burst_factor) / (1 - on))
+            in_burst = (t % args.burst_period) < args.burst_sec
+            t += rng.expovariate(high if in_burst else low)
+        if t >= args.duration:
+            break
+        times.append(t)
+
+    jobs = []
+    for t in times:
+        payload = dict(JOB_CLASSES[rng.choices(classes, weights)[0]])
+        payload["priority"] = "high" if rng.random() < args.high_priority else "normal"
+        jobs.append((t, payload))
+    return jobs
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def at(q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    return {
+        "count": len(values),
+        "p50": at(0.50),
+        "p90": at(0.90),
+        "p99": at(0.99),
+        "max": values[-1],
+        "mean": sum(values) / len(values),
+    }
+
+
+class Recorder:
+    """Stage durations of every executed message, taken from the worker's on_timed hook.
+
+    A sharded job counts as finished when its last shard does.
+    """
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.stages = {stage: [] for stage, _, _ in STAGES}
+        self.finished_at = []
+        self.shards_done = {}
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def on_timed(self, lane, msg, started_at, finished_at):
+        durations = stage_durations({**msg.properties, STARTED_AT: started_at, FINISHED_AT: finished_at})
+        shard = decode_job(msg)["payload"].get("shard")
+        with self._lock:
+            for stage, seconds in durations.items():
+                self.stages[stage].append(seconds)
+            if shard:
+                done = self.shards_done.setdefault(shard["parent_id"], set())
+                done.add(shard["index"])
+                if len(done) < shard["count"]:
+                    return
+            self.finished_at.append(finished_at)
+            if len(self.finished_at) >= self.expected:
+                self.done.set()
+
+
+class ResourceSampler(threading.Thread):
+    """Peak thread count over the run, sampled every 100 ms"""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak_threads = 0
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.wait(0.1):
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+
+def start_loop(stop: threading.Event, step):
+    thread = threading.Thread(target=lambda: [step() for _ in iter(stop.is_set, True)], daemon=True)
+    thread.start()
+    return thread
+
+
+def start_pipeline(args, broker, recorder, stop) -> list:
+    threads = []
+
+    scheduler = load_module("scheduler_main", "scheduler/main.py")
+    scheduler.status_emitter = StatusEmitter(broker)
+    executor = ThreadPoolExecutor(max_workers=scheduler.SCHEDULER_CONCURRENCY)
+    for _ in range(args.schedulers):
+        threads.append(start_loop(stop, lambda: scheduler.schedule_once(broker, executor, max_wait=0.05)))
+
+    def synthetic(job: dict):
+        time.sleep(job["payload"].get("estimated_runtime_sec", 10) * args.time_scale)
+
+    for entry in handlers.HANDLERS.values():
+        entry["handler"] = synthetic
+    runtime.broker = broker
+    runtime.status_emitter = StatusEmitter(broker)
+    runtime.telemetry = Telemetry("WORKER")
+    original_on_timed = runtime.on_job_timed
+
+    def on_timed(lane, msg, started_at, finished_at):
+        original_on_timed(lane, msg, started_at, finished_at)
+        recorder.on_timed(lane, msg, started_at, finished_at)
+
+    runtime.on_job_timed = on_timed
+    for _ in range(args.workers):
+        dispatcher = runtime.create_dispatcher(runtime.parse_queues("actor,ml,spark"), args.worker_concurrency)
+        threads.append(start_loop(stop, dispatcher.run_once))
+    return threads
+
+
+async def submit_all(args, jobs, broker) -> list:
+    """Submit every job at its arrival time; returns submit latencies"""
+    latencies = []
+    api = None
+    if args.target == "api":
+        from starlette.requests import Request
+
+        api = load_module("api_main", "api/main.py")
+        await api.start_ingestion()
+        # Every submission comes from one client, as far as admission control is concerned
+        request = Request({"type": "http", "headers": [], "client": ("bench", 0)})
+
+    async def submit(payload):
+        start = time.perf_counter()
+        if api:
+            await api.submit_job(api.JobPayload(**payload), request, idempotency_key=None)
+        else:
+            job_id = f"job-{random.getrandbits(64):016x}"
+            body, properties = encode_job({"job_id": job_id, "payload": payload}, payload_store())
+            message = Message(body, properties={**properties, **new_trace()}, message_id=job_id)
+            await asyncio.to_thread(broker.send, "jobqueue", message)
+        latencies.append(time.perf_counter() - start)
+
+    loop = asyncio.get_running_loop()
+    began = loop.time()
+    tasks = []
+    for offset, payload in jobs:
+        delay = began + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(submit(payload)))
+    await asyncio.gather(*tasks)
+    if api:
+        await api.stop_ingestion()
+    return latencies
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    jobs = arrivals(args, rng)
+    broker = create_broker("memory")
+    recorder = Recorder(len(jobs))
+    stop = threading.Event()
+    sampler = ResourceSampler()
+    sampler.start()
+
+    threads = start_pipeline(args, broker, recorder, stop)
+    cpu_start = time.process_time()
+    wall_start = time.time()
+    submit_latencies = asyncio.run(submit_all(args, jobs, broker))
+    submitted_at = time.time()
+    recorder.done.wait(args.drain_timeout)
+    wall_end = time.time()
+    cpu = time.process_time() - cpu_start
+
+    stop.set()
+    sampler.stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    completed = len(recorder.finished_at)
+    last_finish = max(recorder.finished_at) if recorder.finished_at else wall_end
+    return {
+        "commit": git_commit(),
+        "jobs_submitted": len(jobs),
+        "jobs_completed": completed,
+        "offered_rate": len(jobs) / max(1e-9, submitted_at - wall_start),
+        "throughput": completed / max(1e-9, last_finish - wall_start),
+        "wall_sec": wall_end - wall_start,
+        "submit_latency": percentiles(submit_latencies),
+        "stages": {stage: percentiles(values) for stage, values in recorder.stages.items()},
+        "resources": {
+            "cpu_sec": cpu,
+            "cpu_util": cpu / max(1e-9, wall_end - wall_start),
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "peak_threads": sampler.peak_threads,
+        },
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Human-readable regressions of ``results`` against ``baseline``"""
+    regressions = []
+    if results["throughput"] < baseline["throughput"] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['throughput']:.1f} -> {results['throughput']:.1f} jobs/s")
+    rows = [("submit", results["submit_latency"], baseline.get("submit_latency", {}))]
+    rows += [(stage, stats, baseline.get("stages", {}).get(stage, {})) for stage, stats in results["stages"].items()]
+    for name, now, before in rows:
+        if now.get("p99") is None or before.get("p99") is None:
+            continue
+        # Ignore sub-millisecond noise
+        if now["p99"] > before["p99"] * (1 + tolerance) and now["p99"] - before["p99"] > 0.001:
+            regressions.append(f"{name} p99 {before['p99'] * 1000:.1f} -> {now['p99'] * 1000:.1f} ms")
+    return regressions
+
+
+def report(results: dict):
+    r = results["resources"]
+    print(f"jobs: {results['jobs_completed']}/{results['jobs_submitted']} completed in {results['wall_sec']:.1f}s")
+    print(f"offered: {results['offered_rate']:.1f} jobs/s, sustained: {results['throughput']:.1f} jobs/s")
+    print(f"cpu: {r['cpu_sec']:.1f}s ({r['cpu_util'] * 100:.0f}% of one core), "
+          f"peak rss: {r['peak_rss_mb']:.0f} MB, peak threads: {r['peak_threads']}")
+    print(f"{'stage':<12}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = [("submit", results["submit_latency"])] + list(results["stages"].items())
+    for name, stats in rows:
+        if stats:
+            print(f"{name:<12}{stats['count']:>8}{stats['p50'] * 1000:>10.1f}{stats['p90'] * 1000:>10.1f}"
+                  f"{stats['p99'] * 1000:>10.1f}{stats['max'] * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("api", "broker"), default="api", help="submit through the API or straight to jobqueue")
+    parser.add_argument("--arrival", choices=("constant", "poisson", "bursty"), default="poisson")
+    parser.add_argument("--rate", type=float, default=100, help="mean jobs per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of arrivals")
+    parser.add_argument("--burst-factor", type=float, default=4, help="rate multiplier inside a burst")
+    parser.add_argument("--burst-sec", type=float, default=1)
+    parser.add_argument("--burst-period", type=float, default=10)
+    parser.add_argument("--trace", help="replay arrivals from this JSON-lines file instead")
+    parser.add_argument("--mix", default="actor=0.8,ml=0.15,spark=0.05", help="class=share pairs")
+    parser.add_argument("--high-priority", type=float, default=0.1, help="fraction of high-priority jobs")
+    parser.add_argument("--time-scale", type=float, default=0.001, help="seconds slept per estimated_runtime_sec")
+    parser.add_argument("--schedulers", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--worker-concurrency", type=int, default=8)
+    parser.add_argument("--drain-timeout", type=float, default=60, help="seconds to wait for jobs after the last arrival")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    results = run(args)
+    report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Compare JSON job messages with the msgpack envelope and claim check, hop by hop.
+
+For jobs whose ``payload["data"]`` is about each of ``--sizes`` KB, measures
+the message size and the CPU time of each hop:
+
+- submit: the API encoding the job
+- scheduler: decoding the routing fields and building the forwarded body
+- worker: decoding the job and getting at its data
+
+``json`` is the old path (``json.dumps`` / ``json.loads(str(msg))`` at every
+hop); ``envelope`` is ``common/envelope.py`` with data inline; ``claim-check``
+also offloads data above ``CLAIM_CHECK_THRESHOLD_BYTES`` to an in-memory
+payload store, so it shows the message cost alone.
+
+    python scripts/bench_envelope.py --sizes 1,16,256,1024 --jobs 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+from envelope import decode_job, encode_job, encoding_properties, job_data
+from payload_store import create_payload_store
+from transport import Message
+
+
+def make_job(i: int, size_kb: int, rng: random.Random) -> dict:
+    """An ml-style job whose data is roughly ``size_kb`` of feature rows"""
+    rows = max(1, size_kb * 1024 // 120)
+    data = {
+        "features": [[round(rng.random(), 6) for _ in range(8)] for _ in range(rows)],
+        "labels": [rng.choice(["a", "b", "c"]) for _ in range(rows)],
+    }
+    return {"job_id": f"job-{i}", "payload": {
+        "rows": rows, "estimated_runtime_sec": 60, "priority": "normal", "data": data
+    }}
+
+
+def run_json(jobs: list) -> dict:
+    timings = {"submit": 0.0, "scheduler": 0.0, "worker": 0.0}
+    size = 0
+    for job in jobs:
+        t0 = time.perf_counter()
+        msg = Message(json.dumps(job))
+        t1 = time.perf_counter()
+        forwarded = Message(json.dumps(json.loads(str(msg))))
+        t2 = time.perf_counter()
+        json.loads(str(forwarded))["payload"].get("data")
+        t3 = time.perf_counter()
+        timings["submit"] += t1 - t0
+        timings["scheduler"] += t2 - t1
+        timings["worker"] += t3 - t2
+        size += len(msg.body)
+    return {"bytes": size / len(jobs), **{hop: t / len(jobs) * 1e6 for hop, t in timings.items()}}
+
+
+def run_envelope(jobs: list, store=None) -> dict:
+    timings = {"submit": 0.0, "scheduler": 0.0, "worker": 0.0}
+    size = 0
+    for job in jobs:
+        t0 = time.perf_counter()
+        body, properties = encode_job(job, store)
+        msg = Message(body, properties=properties)
+        t1 = time.perf_counter()
+        decode_job(msg)
+        forwarded = Message(msg.body, properties=encoding_properties(msg))
+        t2 = time.perf_counter()
+        job_data(decode_job(forwarded), store)
+        t3 = time.perf_counter()
+        timings["submit"] += t1 - t0
+        timings["scheduler"] += t2 - t1
+        timings["worker"] += t3 - t2
+        size += len(msg.body)
+    return {"bytes": size / len(jobs), **{hop: t / len(jobs) * 1e6 for hop, t in timings.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,16,256,1024", help="data sizes in KB")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    store = create_payload_store("memory")
+    results = {}
+    print(f"{'KB':>6}  {'path':<12}{'bytes/msg':>12}{'submit us':>12}{'sched us':>12}{'worker us':>12}")
+    for size_kb in (int(s) for s in args.sizes.split(",")):
+        jobs = [make_job(i, size_kb, rng) for i in range(args.jobs)]
+        results[size_kb] = {
+            "json": run_json(jobs),
+            "envelope": run_envelope(jobs),
+            "claim-check": run_envelope(jobs, store),
+        }
+        for path, r in results[size_kb].items():
+            print(f"{size_kb:>6}  {path:<12}{r['bytes']:>12.0f}{r['submit']:>12.1f}"
+                  f"{r['scheduler']:>12.1f}{r['worker']:>12.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Compare /submit-job send latency: per-request client, sender pool, micro-batching.
+
+Runs against an in-memory stand-in for Service Bus that charges a fixed
+handshake cost when a link is opened and a smaller cost per send, so no
+cloud resources are needed:
+
+    python scripts/bench_submit.py --requests 2000 --concurrency 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "common"))
+
+from transport import SenderPool
+from batcher import JobBatcher
+
+
+class InMemoryBatch(list):
+    max_messages = 500
+
+    def add_message(self, message):
+        if len(self) >= self.max_messages:
+            raise ValueError("batch full")
+        self.append(message)
+
+
+class InMemorySender:
+    def __init__(self, broker, queue_name):
+        self.broker = broker
+        self.queue_name = queue_name
+        self.opened = False
+
+    def _open(self):
+        if not self.opened:
+            time.sleep(self.broker.handshake_sec)
+            self.opened = True
+
+    def create_message_batch(self):
+        self._open()
+        return InMemoryBatch()
+
+    def send_messages(self, message):
+        self._open()
+        # One broker round trip per call, whether it carries one message or a batch
+        time.sleep(self.broker.send_sec)
+        messages = message if isinstance(message, InMemoryBatch) else [message]
+        with self.broker.lock:
+            self.broker.queues.setdefault(self.queue_name, []).extend(messages)
+
+    def close(self):
+        self.opened = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InMemoryClient:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def get_queue_sender(self, queue_name):
+        return InMemorySender(self.broker, queue_name)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InMemoryBroker:
+    def __init__(self, handshake_sec, send_sec):
+        self.handshake_sec = handshake_sec
+        self.send_sec = send_sec
+        self.queues = {}
+        self.lock = threading.Lock()
+
+
+def submit_per_request(broker, body):
+    # Mirrors the original submit_job: a new client and sender for every call
+    with InMemoryClient(broker) as client:
+        sender = client.get_queue_sender(queue_name="jobqueue")
+        with sender:
+            sender.send_messages(body)
+
+
+def make_body():
+    return json.dumps({"job_id": str(uuid.uuid4()), "payload": {"rows": 1000}})
+
+
+def report(label, latencies, requests, elapsed):
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<12} p50={p50:7.2f}ms  p99={p99:7.2f}ms  throughput={requests / elapsed:8.1f} req/s")
+
+
+def run(label, submit, requests, concurrency):
+    latencies = []
+
+    def one(_):
+        body = make_body()
+        start = time.perf_counter()
+        submit(body)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    report(label, latencies, requests, time.perf_counter() - start)
+
+
+async def run_batched(label, pool, requests, concurrency, batch_size, window_ms):
+    batcher = JobBatcher(pool.send_batch, max_batch_size=batch_size, max_delay_ms=window_ms, max_in_flight=pool.size)
+    batcher.start()
+    latencies = []
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with limit:
+            body = make_body()
+            start = time.perf_counter()
+            await batcher.submit(body)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    report(label, latencies, requests, time.perf_counter() - start)
+    await batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--handshake-ms", type=float, default=30.0)
+    parser.add_argument("--send-ms", type=float, default=2.0)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--batch-window-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    broker = InMemoryBroker(args.handshake_ms / 1000, args.send_ms / 1000)
+
+    run("per-request", lambda body: submit_per_request(broker, body), args.requests, args.concurrency)
+
+    pool = SenderPool(lambda: InMemoryClient(broker), "jobqueue", lambda body: body, size=args.pool_size)
+    pool.start()
+    try:
+        run("pooled", pool.send, args.requests, args.concurrency)
+        asyncio.run(run_batched("batched", pool, args.requests, args.concurrency,
+                                args.batch_size, args.batch_window_ms))
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Compare routing with the static cost formula against the learned cost model.
+
+Replays recorded job history (the JSON lines the scheduler appends to
+``JOB_HISTORY_PATH``: payload, measured duration, completion time) in
+order. The learned model is evaluated prequentially: every job is routed
+with the model trained on the jobs before it, then its real duration is
+fed back. A job's "correct" tier is the one the static formula would
+pick had it known the real duration (the "oracle" row).
+
+Total completion time comes from replaying the same arrivals through a
+FIFO pool of ``--slots`` per tier, so long jobs misrouted to a fast tier
+show up as queueing for everything behind them.
+
+    # recorded history
+    python scripts/evaluate_cost_model.py --history job-history.jsonl
+    # synthetic history with noisy user estimates
+    python scripts/evaluate_cost_model.py --synthetic 20000 --json results.json
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scheduler"))
+
+from cost_model import CostModel, static_cost
+
+TIERS = ("actor", "ml", "spark")
+
+
+def tier_for(payload: dict, score: float) -> str:
+    """Same thresholds as scheduler.classify for the AKS queues"""
+    if payload.get("latency_sensitive"):
+        return "actor"
+    if score > 10:
+        return "spark"
+    if score > 4:
+        return "ml"
+    return "actor"
+
+
+def load_history(path):
+    jobs = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            duration = float(record["duration"])
+            completed_at = float(record.get("completed_at", 0))
+            jobs.append({"payload": record["payload"], "duration": duration, "arrival": completed_at - duration})
+    jobs.sort(key=lambda job: job["arrival"])
+    start = jobs[0]["arrival"] if jobs else 0
+    for job in jobs:
+        job["arrival"] -= start
+    return jobs
+
+
+def synthetic_history(count, interarrival, seed):
+    """Runtime driven by rows; users guess it within a factor of ~3 and round up"""
+    rng = random.Random(seed)
+    jobs = []
+    now = 0.0
+    for _ in range(count):
+        rows = int(10 ** rng.uniform(2, 7))
+        duration = (0.5 + rows / 20_000) * rng.lognormvariate(0, 0.3)
+        estimate = max(1, math.ceil(duration * rng.lognormvariate(0.3, 1.0) / 10) * 10)
+        payload = {
+            "rows": rows,
+            "estimated_runtime_sec": estimate,
+            "priority": "high" if rng.random() < 0.2 else "normal",
+            "latency_sensitive": rng.random() < 0.1,
+        }
+        now += rng.expovariate(1.0 / interarrival)
+        jobs.append({"payload": payload, "duration": duration, "arrival": now})
+    return jobs
+
+
+def simulate_completion(jobs, tiers, slots):
+    """Sum of (finish - arrival) with each tier a FIFO pool of slots"""
+    free_at = {tier: [0.0] * slots[tier] for tier in TIERS}
+    latencies = []
+    for job, tier in zip(jobs, tiers):
+        pool = free_at[tier]
+        start = max(job["arrival"], heapq.heappop(pool))
+        finish = start + job["duration"]
+        heapq.heappush(pool, finish)
+        latencies.append(finish - job["arrival"])
+    latencies.sort()
+    return {
+        "total_completion_sec": sum(latencies),
+        "mean_completion_sec": sum(latencies) / max(1, len(latencies)),
+        "p99_completion_sec": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0,
+    }
+
+
+def evaluate(jobs, args):
+    oracle = [tier_for(job["payload"], static_cost(job["payload"], job["duration"])) for job in jobs]
+
+    model = CostModel(forgetting=args.forgetting, min_samples=args.min_samples)
+    routes = {"static": [], "learned": []}
+    log_errors = {"static": [], "learned": []}
+    for job in jobs:
+        payload = job["payload"]
+        predictions = {
+            "static": payload.get("estimated_runtime_sec", 10),
+            "learned": model.predict_runtime(payload),
+        }
+        for name, predicted in predictions.items():
+            routes[name].append(tier_for(payload, static_cost(payload, predicted)))
+            log_errors[name].append(abs(math.log1p(predicted) - math.log1p(job["duration"])))
+        model.update(payload, job["duration"])
+
+    results = {}
+    for name, tiers in routes.items():
+        correct = sum(1 for routed, best in zip(tiers, oracle) if routed == best)
+        errors = sorted(log_errors[name])
+        results[name] = {
+            "routing_accuracy_pct": 100.0 * correct / max(1, len(jobs)),
+            "median_log_error": errors[len(errors) // 2] if errors else 0,
+            **simulate_completion(jobs, tiers, args.slots),
+        }
+    # The thresholds are not capacity-aware, so perfect routing is not the fastest schedule
+    results["oracle"] = {
+        "routing_accuracy_pct": 100.0,
+        "median_log_error": 0.0,
+        **simulate_completion(jobs, oracle, args.slots),
+    }
+    return results
+
+
+def parse_slots(spec):
+    slots = {"actor": 8, "ml": 4, "spark": 2}
+    for entry in spec.split(","):
+        if entry.strip():
+            tier, _, count = entry.partition("=")
+            slots[tier.strip()] = int(count)
+    return slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", help="JSON lines job history written by the scheduler")
+    parser.add_argument("--synthetic", type=int, default=10000, help="synthetic jobs when no history is given")
+    parser.add_argument("--interarrival", type=float, default=12.0, help="mean seconds between synthetic jobs")
+    parser.add_argument("--slots", type=parse_slots, default=parse_slots(""),
+                        help="concurrent jobs per tier, e.g. actor=8,ml=4,spark=2")
+    parser.add_argument("--forgetting", type=float, default=0.999)
+    parser.add_argument("--min-samples", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    jobs = load_history(args.history) if args.history else synthetic_history(args.synthetic, args.interarrival, args.seed)
+    results = evaluate(jobs, args)
+
+    print(f"{len(jobs)} jobs")
+    print(f"{'model':<10}{'accuracy %':>12}{'log err':>9}{'total s':>14}{'mean s':>10}{'p99 s':>10}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['routing_accuracy_pct']:>12.2f}{r['median_log_error']:>9.3f}"
+              f"{r['total_completion_sec']:>14.0f}{r['mean_completion_sec']:>10.1f}{r['p99_completion_sec']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": {**vars(args), "jobs": len(jobs)}, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Replay a job arrival trace against the old and new orchestrator scaling policies.
+
+The simulation advances in one-second ticks: jobs arrive from the trace,
+wait in a FIFO queue and run on `slots` concurrent slots per ready replica
+with exponentially distributed service times. New replicas become ready
+after a startup delay. Every check interval the policy sees the same
+signals the orchestrator gets in production (queue depth, completion
+count, duration totals) and sets the replica count.
+
+    # synthetic bursty trace
+    python scripts/simulate_autoscaler.py --duration 3600
+    # recorded trace: one arrival timestamp (seconds) per line
+    python scripts/simulate_autoscaler.py --trace arrivals.txt --slo 20
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "orchestrator"))
+
+from autoscaling import PredictiveScaler, calculate_needed_replicas
+
+
+def load_trace(path):
+    arrivals = []
+    with open(path) as f:
+        for line in f:
+            line = line.split(",")[0].strip()
+            if line and not line.startswith("#"):
+                try:
+                    arrivals.append(float(line))
+                except ValueError:
+                    continue  # header row
+    arrivals.sort()
+    start = arrivals[0] if arrivals else 0
+    return [t - start for t in arrivals]
+
+
+def synthetic_trace(duration, base_rate, burst_rate, burst_every, burst_len, seed):
+    """Poisson arrivals at base_rate with periodic ramped bursts"""
+    rng = random.Random(seed)
+    arrivals = []
+    t = 0.0
+    while t < duration:
+        phase = t % burst_every
+        if phase < burst_len:
+            # Ramp up over the first third of the burst, then hold
+            ramp = min(1.0, phase / (burst_len / 3))
+            rate = base_rate + (burst_rate - base_rate) * ramp
+        else:
+            rate = base_rate
+        t += rng.expovariate(rate)
+        arrivals.append(t)
+    return arrivals
+
+
+class Simulation:
+    def __init__(self, policy, arrivals, args):
+        self.policy = policy
+        self.arrivals = arrivals
+        self.args = args
+        self.rng = random.Random(args.seed)
+
+    def run(self):
+        args = self.args
+        queue = []          # arrival times of waiting jobs (FIFO)
+        running = []        # heap of (finish_time, arrival_time, duration)
+        ready = args.min_replicas
+        starting = []       # ready_at times of replicas still starting
+        completed = 0
+        duration_sum = 0.0
+        latencies = []
+        replica_seconds = 0.0
+        scale_events = 0
+        next_arrival = 0
+        horizon = (self.arrivals[-1] if self.arrivals else 0) + args.drain
+        now = 0.0
+
+        while now < horizon:
+            now += 1.0
+            while next_arrival < len(self.arrivals) and self.arrivals[next_arrival] <= now:
+                queue.append(self.arrivals[next_arrival])
+                next_arrival += 1
+
+            ready += sum(1 for t in starting if t <= now)
+            starting = [t for t in starting if t > now]
+
+            while running and running[0][0] <= now:
+                finish, arrived, duration = heapq.heappop(running)
+                completed += 1
+                duration_sum += duration
+                latencies.append(finish - arrived)
+
+            capacity = ready * args.slots
+            head = 0
+            while head < len(queue) and len(running) < capacity:
+                duration = self.rng.expovariate(1.0 / args.service_time)
+                heapq.heappush(running, (now + duration, queue[head], duration))
+                head += 1
+            del queue[:head]
+
+            if int(now) % args.check_interval == 0:
+                target = self.policy(now, len(queue), completed, duration_sum)
+                current = ready + len(starting)
+                if target > current:
+                    starting += [now + args.startup] * (target - current)
+                    scale_events += 1
+                elif target < current:
+                    remove = current - target
+                    # Cancel replicas that are still starting before stopping ready ones
+                    cancelled = min(remove, len(starting))
+                    starting = starting[:len(starting) - cancelled]
+                    ready -= remove - cancelled
+                    scale_events += 1
+
+            replica_seconds += ready + len(starting)
+
+            if next_arrival >= len(self.arrivals) and not queue and not running:
+                break
+
+        latencies.sort()
+        violations = sum(1 for latency in latencies if latency > args.slo)
+        return {
+            "jobs": len(latencies),
+            "slo_violations": violations,
+            "slo_violation_pct": 100.0 * violations / max(1, len(latencies)),
+            "p50_latency_sec": latencies[len(latencies) // 2] if latencies else 0,
+            "p99_latency_sec": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0,
+            "replica_seconds": replica_seconds,
+            "scale_events": scale_events,
+        }
+
+
+def threshold_policy(args):
+    def policy(now, depth, completed, duration_sum):
+        return calculate_needed_replicas(depth, args.threshold, args.min_replicas, args.max_replicas)
+    return policy
+
+
+def predictive_policy(args):
+    scaler = PredictiveScaler(args.slots, args.slo, args.min_replicas, args.max_replicas,
+                              alpha=args.alpha, beta=args.beta,
+                              stabilization_sec=args.stabilization,
+                              scale_down_cooldown_sec=args.scale_down_cooldown,
+                              default_service_time=args.service_time)
+
+    def policy(now, depth, completed, duration_sum):
+        scaler.observe(now, depth, completed, duration_sum, completed)
+        return scaler.desired(now)
+    return policy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="file with one arrival timestamp (seconds) per line")
+    parser.add_argument("--duration", type=float, default=3600, help="synthetic trace length in seconds")
+    parser.add_argument("--base-rate", type=float, default=2.0, help="synthetic arrivals/sec outside bursts")
+    parser.add_argument("--burst-rate", type=float, default=20.0, help="synthetic arrivals/sec at burst peak")
+    parser.add_argument("--burst-every", type=float, default=600)
+    parser.add_argument("--burst-len", type=float, default=180)
+    parser.add_argument("--service-time", type=float, default=1.0, help="mean job duration in seconds")
+    parser.add_argument("--slots", type=int, default=8, help="concurrent jobs per replica")
+    parser.add_argument("--threshold", type=int, default=5, help="messages per replica for the old policy")
+    parser.add_argument("--slo", type=float, default=30, help="end-to-end latency SLO in seconds")
+    parser.add_argument("--min-replicas", type=int, default=1)
+    parser.add_argument("--max-replicas", type=int, default=10)
+    parser.add_argument("--check-interval", type=int, default=10)
+    parser.add_argument("--startup", type=float, default=20, help="seconds before a new replica serves jobs")
+    parser.add_argument("--drain", type=float, default=600, help="extra seconds simulated after the last arrival")
+    parser.add_argument("--alpha", type=float, default=0.5, help="Holt level smoothing")
+    parser.add_argument("--beta", type=float, default=0.3, help="Holt trend smoothing")
+    parser.add_argument("--stabilization", type=float, default=120, help="scale-down stabilization window (s)")
+    parser.add_argument("--scale-down-cooldown", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.trace:
+        arrivals = load_trace(args.trace)
+    else:
+        arrivals = synthetic_trace(args.duration, args.base_rate, args.burst_rate,
+                                   args.burst_every, args.burst_len, args.seed)
+
+    results = {}
+    for name, factory in (("threshold", threshold_policy), ("predictive", predictive_policy)):
+        results[name] = Simulation(factory(args), arrivals, args).run()
+
+    print(f"{'policy':<12}{'jobs':>8}{'SLO viol.':>12}{'viol. %':>9}{'p50 s':>8}{'p99 s':>8}{'replica-s':>11}{'events':>8}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['jobs']:>8}{r['slo_violations']:>12}{r['slo_violation_pct']:>9.2f}"
+              f"{r['p50_latency_sec']:>8.1f}{r['p99_latency_sec']:>8.1f}{r['replica_seconds']:>11.0f}{r['scale_events']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Discrete-event comparison of AKS/Batch routing policies for heavy jobs.
+
+ml and spark jobs arrive in bursts. Each AKS tier is a FIFO queue served
+by a fixed number of worker slots; Azure Batch is one pool of nodes with
+a per-task scheduling overhead. Policies:
+
+- ``aks-only``: Batch not configured, every job goes to its AKS queue
+- ``static``: the old rule, every heavy job goes to Batch
+- ``load-aware``: ``placement.Placement`` (what the scheduler's classify
+  uses) fed the same cached snapshots it gets in production: queue depths
+  and pool node counts refreshed every ``--refresh`` seconds, completions
+  as workers report them
+
+    python scripts/simulate_routing.py --jobs 2000 --batch-nodes 4
+"""
+import argparse
+import collections
+import heapq
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scheduler"))
+
+from placement import Placement
+
+
+def synthetic_jobs(count, rate, burst_every, burst_len, burst_factor, spark_share, seed):
+    """(arrival, tier, runtime) with periodic bursts of arrivals"""
+    rng = random.Random(seed)
+    jobs = []
+    t = 0.0
+    for _ in range(count):
+        in_burst = t % burst_every < burst_len
+        t += rng.expovariate(rate * (burst_factor if in_burst else 1.0))
+        if rng.random() < spark_share:
+            jobs.append((t, "spark", rng.lognormvariate(4.5, 0.5)))   # ~90s
+        else:
+            jobs.append((t, "ml", rng.lognormvariate(3.4, 0.5)))      # ~30s
+    return jobs
+
+
+class Simulation:
+    def __init__(self, policy, jobs, args):
+        self.policy = policy
+        self.jobs = jobs
+        self.args = args
+
+    def run(self):
+        args = self.args
+        events = []
+        seq = 0
+
+        def push(time, kind, data=None):
+            nonlocal seq
+            heapq.heappush(events, (time, seq, kind, data))
+            seq += 1
+
+        slots = {"ml": args.ml_slots, "spark": args.spark_slots}
+        busy = {"ml": 0, "spark": 0}
+        waiting = {"ml": collections.deque(), "spark": collections.deque()}
+        batch_waiting = collections.deque()
+        batch_busy = 0
+        placement = Placement(batch_overhead_sec=args.batch_overhead, batch_startup_sec=args.batch_startup)
+        depth_snapshot = {"ml": 0, "spark": 0}
+        pool_snapshot = {"idle": args.batch_nodes, "running": 0, "total": args.batch_nodes}
+        latencies = []
+        routed = collections.Counter()
+        makespan = 0.0
+
+        for arrival, tier, runtime in self.jobs:
+            push(arrival, "arrival", (arrival, tier, runtime))
+        if self.policy == "load-aware":
+            push(0.0, "refresh")
+
+        def start_aks(now, tier):
+            nonlocal busy
+            while waiting[tier] and busy[tier] < slots[tier]:
+                arrival, runtime = waiting[tier].popleft()
+                busy[tier] += 1
+                push(now + runtime, "aks_done", (tier, arrival))
+
+        def start_batch(now):
+            nonlocal batch_busy
+            while batch_waiting and batch_busy < args.batch_nodes:
+                arrival, runtime = batch_waiting.popleft()
+                batch_busy += 1
+                push(now + args.batch_overhead + runtime, "batch_done", arrival)
+
+        remaining = len(self.jobs)
+        while events and remaining:
+            now, _, kind, data = heapq.heappop(events)
+            if kind == "arrival":
+                arrival, tier, runtime = data
+                if self.policy == "aks-only":
+                    platform = "aks"
+                elif self.policy == "static":
+                    platform = "batch"
+                else:
+                    platform = placement.choose(tier, depth_snapshot[tier], runtime, pool_snapshot, now)
+                routed[platform] += 1
+                if platform == "batch":
+                    placement.record_batch(runtime, now)
+                    batch_waiting.append((arrival, runtime))
+                    start_batch(now)
+                else:
+                    placement.record_aks(tier)
+                    waiting[tier].append((arrival, runtime))
+                    start_aks(now, tier)
+            elif kind == "aks_done":
+                tier, arrival = data
+                busy[tier] -= 1
+                placement.record_completion(tier, now)
+                latencies.append(now - arrival)
+                makespan = now
+                remaining -= 1
+                start_aks(now, tier)
+            elif kind == "batch_done":
+                batch_busy -= 1
+                latencies.append(now - data)
+                makespan = now
+                remaining -= 1
+                start_batch(now)
+            elif kind == "refresh":
+                depth_snapshot = {tier: len(queue) for tier, queue in waiting.items()}
+                pool_snapshot = {"idle": args.batch_nodes - batch_busy, "running": batch_busy,
+                                 "total": args.batch_nodes}
+                placement.observe_snapshot(now)
+                push(now + args.refresh, "refresh")
+
+        latencies.sort()
+        return {
+            "jobs": len(latencies),
+            "makespan_sec": makespan,
+            "throughput_per_min": 60.0 * len(latencies) / max(makespan, 1e-9),
+            "mean_completion_sec": sum(latencies) / max(1, len(latencies)),
+            "p95_completion_sec": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0,
+            "to_batch": routed["batch"],
+            "to_aks": routed["aks"],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0.05, help="arrivals/sec outside bursts")
+    parser.add_argument("--burst-every", type=float, default=1800)
+    parser.add_argument("--burst-len", type=float, default=300)
+    parser.add_argument("--burst-factor", type=float, default=6.0, help="arrival rate multiplier in a burst")
+    parser.add_argument("--spark-share", type=float, default=0.3, help="fraction of jobs in the spark tier")
+    parser.add_argument("--ml-slots", type=int, default=4, help="concurrent ml jobs across AKS workers")
+    parser.add_argument("--spark-slots", type=int, default=2, help="concurrent spark jobs across AKS workers")
+    parser.add_argument("--batch-nodes", type=int, default=4)
+    parser.add_argument("--batch-overhead", type=float, default=30, help="Batch scheduling overhead per task")
+    parser.add_argument("--batch-startup", type=float, default=180, help="node startup when the pool has none ready")
+    parser.add_argument("--refresh", type=float, default=5, help="seconds between state snapshots")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    jobs = synthetic_jobs(args.jobs, args.rate, args.burst_every, args.burst_len,
+                          args.burst_factor, args.spark_share, args.seed)
+    results = {policy: Simulation(policy, jobs, args).run() for policy in ("aks-only", "static", "load-aware")}
+
+    print(f"{'policy':<12}{'jobs':>7}{'makespan s':>12}{'jobs/min':>10}{'mean s':>9}{'p95 s':>9}{'batch':>7}{'aks':>7}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['jobs']:>7}{r['makespan_sec']:>12.0f}{r['throughput_per_min']:>10.2f}"
+              f"{r['mean_completion_sec']:>9.1f}{r['p95_completion_sec']:>9.1f}{r['to_batch']:>7}{r['to_aks']:>7}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dedup import CLAIMED, DONE, DedupStore
+from envelope import decode_fused, decode_job, is_fused
+from retry import member_message, quarantine_marked, resent_message, settle_failed
+import time
+
+# How long the loop blocks on the broker while jobs are running or other
+# queues need polling, so finished jobs are settled promptly
+POLL_INTERVAL = 0.2
+IDLE_WAIT = 5
+# Wait per lane while sweeping for work; enough for a prefetched message, not for an empty queue
+SWEEP_WAIT = 0.01
+
+
+def timed_call(handler, job: dict) -> tuple:
+    """Run a job handler and return when it started and how long it took (runs inside the executor)"""
+    start_time = time.time()
+    handler(job)
+    return start_time, time.time() - start_time
+
+
+def dedup_key(job: dict):
+    job_id = job.get("job_id")
+    return f"run:{job_id}" if job_id else None
+
+
+class Lane:
+    """One consumed queue: where jobs come from and how they are executed"""
+
+    def __init__(self, job_type: str, queue_name: str, handler, mode: str = "thread", weight: int = 1,
+                 priority: str = "normal"):
+        self.job_type = job_type
+        self.queue_name = queue_name
+        self.handler = handler
+        self.mode = mode
+        self.weight = weight
+        self.priority = priority
+        self.current = 0
+        self.polled_at = time.time()
+
+
+class ConcurrentDispatcher:
+    """Runs up to ``concurrency`` jobs at a time from one or more queues.
+
+    Each lane's ``mode`` picks a thread pool (I/O-bound handlers) or a
+    process pool (CPU-bound handlers; the handler must be a picklable
+    top-level function). Lanes share the in-flight window and are polled
+    with smooth weighted round-robin, so a lane with weight 3 gets first
+    pick of free slots three times as often as a lane with weight 1. A lane
+    that has not been polled for ``max_lane_wait`` seconds jumps ahead of
+    the rotation, which bounds how long heavy lanes can starve a light one.
+
+    Only the dispatching thread touches the broker: it receives just enough
+    messages to refill the window, settles finished jobs, and renews the
+    lock of any message running longer than ``lock_renew_sec`` so the
+    broker does not redeliver it mid-execution.
+
+    Every job id is claimed in ``dedup`` before it runs. Copies of a job
+    that already finished are completed without running; copies of a job
+    that is still running elsewhere are held (with their lock renewed) and
+    rechecked each tick, until the original finishes or gives up its claim.
+
+    ``on_timed(lane, msg, started_at, finished_at)``, if given, is called
+    for every successful run with the handler's own start and end times.
+
+    A failed job is not abandoned: ``retry.settle_failed`` schedules a copy
+    after a backoff or, once the job cannot succeed, dead-letters it, and
+    ``on_retry(lane, job, error, outcome)`` is told which. Messages marked
+    for quarantine are dead-lettered as they arrive, without running.
+
+    A fused message is expanded into its member jobs, which run, report and
+    count against the window one by one. The fused message itself is
+    completed once every member has settled; a member that fails is sent
+    back to the lane's queue on its own, so only it is retried.
+    """
+
+    def __init__(self, broker, lanes: list, on_success, on_failure,
+                 concurrency: int = 4, lock_renew_sec: float = 30,
+                 max_lane_wait: float = 60, on_received=None, dedup: DedupStore = None,
+                 on_duplicate=None, on_timed=None, on_retry=None):
+        self.broker = broker
+        self.lanes = lanes
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.on_retry = on_retry
+        self.on_received = on_received
+        self.on_duplicate = on_duplicate
+        self.on_timed = on_timed
+        self.dedup = dedup or DedupStore()
+        self.concurrency = concurrency
+        self.lock_renew_sec = lock_renew_sec
+        self.max_lane_wait = max_lane_wait
+        self.executors = {}
+        for lane in lanes:
+            if lane.mode not in self.executors:
+                executor_class = ProcessPoolExecutor if lane.mode == "process" else ThreadPoolExecutor
+                self.executors[lane.mode] = executor_class(max_workers=concurrency)
+        self.in_flight = {}
+        self.deferred = []
+
+    def _poll_order(self) -> list:
+        """Smooth weighted round-robin: the winner goes first, the rest follow by credit.
+
+        Starved lanes, longest-waiting first, are put ahead of that order.
+        """
+        total = sum(lane.weight for lane in self.lanes)
+        for lane in self.lanes:
+            lane.current += lane.weight
+        ordered = sorted(self.lanes, key=lambda lane: lane.current, reverse=True)
+        ordered[0].current -= total
+        now = time.time()
+        starved = sorted(
+            (lane for lane in ordered if now - lane.polled_at >= self.max_lane_wait),
+            key=lambda lane: lane.polled_at
+        )
+        return starved + [lane for lane in ordered if lane not in starved]
+
+    def _free_slots(self) -> int:
+        return self.concurrency - len(self.in_flight) - len(self.deferred)
+
+    def _fill(self):
+        free = self._free_slots()
+        if free <= 0:
+            return
+        order = self._poll_order()
+        # Sweep the lanes with a short wait each, so empty lanes barely delay the one with work
+        for lane in order:
+            if self._receive(lane, free, SWEEP_WAIT):
+                return
+        # Every lane is empty: block on the next one in the rotation
+        idle = not self.in_flight and len(self.lanes) == 1
+        self._receive(order[0], free, IDLE_WAIT if idle else POLL_INTERVAL)
+
+    def _receive(self, lane: Lane, max_count: int, max_wait: float) -> int:
+        received = self.broker.receive_batch(lane.queue_name, max_count=max_count, max_wait=max_wait)
+        lane.polled_at = time.time()
+        for msg in received:
+            self._start(lane, msg)
+        return len(received)
+
+    def _start(self, lane: Lane, msg):
+        if quarantine_marked(self.broker, msg):
+            return
+        if not is_fused(msg):
+            self._start_job(lane, msg, None)
+            return
+        try:
+            members = decode_fused(msg)
+        except Exception as e:
+            self.on_failure(lane.job_type, {}, e)
+            self._fail({"lane": lane, "msg": msg, "fused": None, "job": {}}, e)
+            return
+        # Lock renewal and settlement go to the fused message, which the members share
+        fused = {"msg": msg, "pending": len(members), "failed": False, "renewed_at": time.time()}
+        for member in members:
+            self._start_job(lane, member, fused)
+
+    def _start_job(self, lane: Lane, msg, fused):
+        entry = {"lane": lane, "msg": msg, "fused": fused, "renewed_at": time.time()}
+        try:
+            entry["job"] = decode_job(msg)
+        except Exception as e:
+            entry["job"] = {}
+            self.on_failure(lane.job_type, {}, e)
+            self._fail(entry, e)
+            return
+        if self.on_received:
+            self.on_received(lane, msg, entry["job"])
+        self._claim_and_run(entry)
+
+    def _complete(self, entry: dict):
+        if entry["fused"] is None:
+            self.broker.complete(entry["msg"])
+        else:
+            self._member_settled(entry["fused"])
+
+    def _abandon(self, entry: dict):
+        fused = entry["fused"]
+        if fused is None:
+            self.broker.abandon(entry["msg"])
+            return
+        try:
+            self.broker.send(entry["lane"].queue_name, resent_message(entry["msg"], "resend"))
+        except Exception as e:
+            # Redeliver the whole fused message instead; members that already ran are skipped by dedup
+            print(f"Could not requeue {entry['msg'].message_id}: {e}", flush=True)
+            fused["failed"] = True
+        self._member_settled(fused)
+
+    def _fail(self, entry: dict, error: Exception):
+        """Retry the entry's job after a backoff, or quarantine it once it cannot succeed"""
+        fused = entry["fused"]
+        try:
+            if fused is None:
+                outcome = settle_failed(self.broker, entry["msg"], error)
+            else:
+                outcome, message = member_message(entry["msg"], error)
+                self.broker.send(entry["lane"].queue_name, message)
+        except Exception as e:
+            # Without a scheduled retry, fall back to an immediate redelivery
+            print(f"Could not schedule a retry of {entry['msg'].message_id}: {e}", flush=True)
+            self._abandon(entry)
+            return
+        if fused is not None:
+            self._member_settled(fused)
+        if self.on_retry:
+            self.on_retry(entry["lane"], entry["job"], error, outcome)
+
+    def _member_settled(self, fused: dict):
+        fused["pending"] -= 1
+        if fused["pending"] == 0:
+            if fused["failed"]:
+                self.broker.abandon(fused["msg"])
+            else:
+                self.broker.complete(fused["msg"])
+
+    def _claim_and_run(self, entry: dict):
+        """Run the entry's job unless it is a duplicate; hold it while another copy is running"""
+        lane, job = entry["lane"], entry["job"]
+        key = dedup_key(job)
+        state = self.dedup.claim(key) if key else CLAIMED
+        if state == DONE:
+            if self.on_duplicate:
+                self.on_duplicate(lane.job_type, job)
+            self._complete(entry)
+        elif state != CLAIMED:
+            self.deferred.append(entry)
+        else:
+            future = self.executors[lane.mode].submit(timed_call, lane.handler, job)
+            self.in_flight[future] = entry
+
+    def _recheck_deferred(self):
+        deferred, self.deferred = self.deferred, []
+        for entry in deferred:
+            self._claim_and_run(entry)
+
+    def _settle(self, timeout: float):
+        if not self.in_flight:
+            return
+        done, _ = wait(self.in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            entry = self.in_flight.pop(future)
+            job_type = entry["lane"].job_type
+            key = dedup_key(entry["job"])
+            try:
+                started_at, duration = future.result()
+            except Exception as e:
+                if key:
+                    self.dedup.release(key)
+                self.on_failure(job_type, entry["job"], e)
+                self._fail(entry, e)
+            else:
+                # Marked done before completing, so a redelivery after a lost lock is skipped
+                if key:
+                    self.dedup.complete(key)
+                self.on_success(job_type, entry["job"], duration)
+                if self.on_timed:
+                    self.on_timed(entry["lane"], entry["msg"], started_at, started_at + duration)
+                self._complete(entry)
+
+    def _renew_locks(self):
+        now = time.time()
+        for entry in list(self.in_flight.values()) + self.deferred:
+            # Members of a fused message hold no lock of their own
+            held = entry["fused"] or entry
+            if now - held["renewed_at"] >= self.lock_renew_sec:
+                try:
+                    self.broker.renew_lock(held["msg"])
+                    held["renewed_at"] = now
+                except Exception as e:
+                    print(f"Lock renewal failed for {entry['job'].get('job_id', 'unknown')}: {e}", flush=True)
+
+    def run_once(self):
+        self._recheck_deferred()
+        self._fill()
+        # With a full window nothing can be received, so wait on the jobs instead
+        full = self._free_slots() <= 0
+        if full and not self.in_flight:
+            # Only held duplicates: wait for their originals to finish elsewhere
+            time.sleep(POLL_INTERVAL)
+        self._settle(timeout=POLL_INTERVAL if full else 0)
+        self._renew_locks()
+
+    def run(self):
+        while True:
+            self.run_once()
+
+    def shutdown(self):
+        """Let running jobs finish and settle them before returning"""
+        while self.in_flight:
+            self._settle(timeout=None)
+        for entry in self.deferred:
+            self._abandon(entry)
+        self.deferred = []
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
@@ -0,0 +1,90 @@
+"""Job handlers, registered by job type.
+
+A handler takes the decoded job dict and raises on failure; failed jobs are
+retried with backoff, except for permanent errors such as
+``retry.PermanentError``, which quarantine the job at once. Each entry
+also names the queue it consumes and whether it runs on threads (I/O-bound)
+or processes (CPU-bound). Handlers must stay top-level functions so the
+process pool can pickle them.
+
+Handlers may run in pool processes, so they print directly, and only for
+jobs picked by the shared log sampling; payloads are printed at DEBUG only.
+
+The job arrives without ``payload["data"]``; a handler that needs the data
+calls ``envelope.job_data(job)``, which unpacks it (or fetches it from the
+payload store) on first use.
+"""
+import time
+from telemetry import LOG_LEVEL, sampled
+
+HANDLERS = {}
+
+
+def register(job_type: str, queue_name: str, mode: str = "thread"):
+    def decorator(handler):
+        HANDLERS[job_type] = {"handler": handler, "queue": queue_name, "mode": mode}
+        return handler
+    return decorator
+
+
+@register("actor", "actor-jobs", mode="thread")
+def actor_job(job: dict):
+    """Process actor job - low latency, lightweight tasks"""
+    job_id = job.get("job_id", "unknown")
+    payload = job.get("payload", {})
+
+    if sampled(job_id):
+        print(f"[ACTOR] Processing job {job_id}", flush=True)
+    if LOG_LEVEL == "DEBUG":
+        print(f"[ACTOR] Payload: {payload}", flush=True)
+
+    # Simulate processing
+    time.sleep(1)
+
+
+@register("spark", "spark-jobs", mode="process")
+def spark_job(job: dict):
+    """Process spark job - high compute, data-intensive tasks"""
+    job_id = job.get("job_id", "unknown")
+    payload = job.get("payload", {})
+
+    if sampled(job_id):
+        print(f"[SPARK] Processing job {job_id} ({payload.get('rows', 'N/A')} rows, "
+              f"estimated {payload.get('estimated_runtime_sec', 'N/A')}s)", flush=True)
+    # A shard of a split job covers rows [row_start, row_end) of its parent's input
+    shard = payload.get("shard")
+    if shard and sampled(job_id):
+        print(f"[SPARK] Shard {shard['index'] + 1}/{shard['count']} of {shard['parent_id']}: "
+              f"rows {shard['row_start']}-{shard['row_end']}", flush=True)
+
+    # Simulate heavy processing
+    runtime = payload.get("estimated_runtime_sec", 5)
+    time.sleep(min(runtime, 10))  # Cap at 10s for testing
+
+
+@register("ml", "ml-jobs", mode="process")
+def ml_job(job: dict):
+    """Process ml job - medium compute jobs that AKS keeps when Batch is off"""
+    job_id = job.get("job_id", "unknown")
+    payload = job.get("payload", {})
+
+    if sampled(job_id):
+        print(f"[ML] Processing job {job_id}", flush=True)
+
+    # Simulate training/inference
+    runtime = payload.get("estimated_runtime_sec", 5)
+    time.sleep(min(runtime, 5))  # Cap at 5s for testing
+
+
+@register("batch", "batch-jobs", mode="process")
+def batch_job(job: dict):
+    """Process batch job - throughput-oriented work with no latency target"""
+    job_id = job.get("job_id", "unknown")
+    payload = job.get("payload", {})
+
+    if sampled(job_id):
+        print(f"[BATCH] Processing job {job_id}", flush=True)
+
+    # Simulate a batch step
+    runtime = payload.get("estimated_runtime_sec", 5)
+    time.sleep(min(runtime, 10))  # Cap at 10s for testing
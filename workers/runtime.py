@@ -0,0 +1,179 @@
+"""Worker runtime shared by every job type.
+
+Consumes the queues listed in ``WORKER_QUEUES`` (``type:weight`` pairs, e.g.
+``actor:3,ml:1``) with the handlers from ``handlers.HANDLERS``, so a single
+image can serve any mix of queues. Each job type is consumed from two lanes,
+its ``-high`` priority queue weighted ``HIGH_PRIORITY_WEIGHT`` times its
+normal queue.
+"""
+from prometheus_client import Counter, Histogram
+from metrics import DURATION_BUCKETS, start_metrics_server
+from transport import connect_with_retry
+from concurrency import ConcurrentDispatcher, Lane
+from handlers import HANDLERS
+from priority import lane_queue, queue_wait
+from dedup import create_dedup_store
+from job_status import DONE, FAILED, QUARANTINED, RUNNING, StatusEmitter
+from tracing import FINISHED_AT, STARTED_AT, stage_durations
+from telemetry import Telemetry
+from envelope import discard_data
+from retry import RETRIED
+import json
+import os
+import socket
+import time
+
+# Prometheus metrics
+jobs_processed = Counter('jobs_processed_total', 'Total jobs processed', ['worker_type'])
+job_processing_duration = Histogram('job_processing_duration_seconds', 'Job processing time', ['worker_type'])
+job_errors = Counter('job_errors_total', 'Total job errors', ['worker_type'])
+job_duplicates = Counter('job_duplicates_total', 'Redelivered jobs skipped because they already ran', ['worker_type'])
+job_retries = Counter('job_retries_total', 'Failed jobs scheduled for a retry or quarantined',
+                      ['worker_type', 'outcome'])
+job_queue_wait = Histogram('job_queue_wait_seconds', 'Time a job waited in its worker queue',
+                           ['worker_type', 'priority'],
+                           buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+job_stage_duration = Histogram('job_stage_duration_seconds',
+                               'Time a job spent in each stage from submission to completion (see tracing.STAGES)',
+                               ['worker_type', 'stage'], buckets=DURATION_BUCKETS)
+
+# Unset values fall back to the defaults passed to main() by the entry script
+WORKER_QUEUES = os.getenv("WORKER_QUEUES")
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Concurrency: WORKER_MODE overrides each handler's "thread"/"process" default
+WORKER_MODE = os.getenv("WORKER_MODE")
+WORKER_CONCURRENCY = os.getenv("WORKER_CONCURRENCY")
+LOCK_RENEW_INTERVAL = float(os.getenv("LOCK_RENEW_INTERVAL", "30"))
+
+# Priority lanes: polling weight of a -high queue relative to its normal queue,
+# and how long any lane may go unpolled before it jumps the rotation
+HIGH_PRIORITY_WEIGHT = int(os.getenv("HIGH_PRIORITY_WEIGHT", "4"))
+LANE_MAX_WAIT = float(os.getenv("LANE_MAX_WAIT", "60"))
+
+# Measured durations go back to the scheduler, which learns its cost model from them
+RESULTS_QUEUE = "job-results"
+
+broker = None
+status_emitter = None
+telemetry = None
+WORKER_NAME = socket.gethostname()
+
+def parse_queues(spec: str) -> list:
+    """Turn "actor:3,ml" into high and normal lanes per type, weight defaulting to 1"""
+    lanes = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        job_type, _, weight = entry.partition(":")
+        if job_type not in HANDLERS:
+            raise ValueError(f"No handler registered for job type '{job_type}'")
+        handler = HANDLERS[job_type]
+        weight = int(weight or 1)
+        for priority, lane_weight in (("high", weight * HIGH_PRIORITY_WEIGHT), ("normal", weight)):
+            lanes.append(Lane(
+                job_type,
+                lane_queue(handler["queue"], priority),
+                handler["handler"],
+                mode=WORKER_MODE or handler["mode"],
+                weight=lane_weight,
+                priority=priority
+            ))
+    return lanes
+
+def on_job_received(lane: Lane, msg, job: dict):
+    status_emitter.emit(job.get("job_id"), RUNNING, worker=WORKER_NAME, target=lane.queue_name)
+    wait = queue_wait(msg)
+    if wait is not None:
+        job_queue_wait.labels(worker_type=lane.job_type, priority=lane.priority).observe(wait)
+
+def on_job_timed(lane: Lane, msg, started_at: float, finished_at: float):
+    """Break the job's trace down into stages, now that every stamp is known"""
+    stamps = {**msg.properties, STARTED_AT: started_at, FINISHED_AT: finished_at}
+    for stage, seconds in stage_durations(stamps).items():
+        job_stage_duration.labels(worker_type=lane.job_type, stage=stage).observe(seconds)
+
+def on_job_done(job_type: str, job: dict, duration: float):
+    job_processing_duration.labels(worker_type=job_type).observe(duration)
+    jobs_processed.labels(worker_type=job_type).inc()
+    status_emitter.emit(job.get("job_id"), DONE, worker=WORKER_NAME, duration=duration)
+    telemetry.job(job.get("job_id"), "Completed %s job %s in %.2fs", job_type, job.get("job_id"), duration)
+    try:
+        broker.send(RESULTS_QUEUE, json.dumps({
+            "job_id": job.get("job_id"),
+            "job_type": job_type,
+            "payload": job.get("payload", {}),
+            "duration": duration,
+            "completed_at": time.time()
+        }))
+    except Exception as e:
+        telemetry.logger.warning("Could not report result of %s: %s", job.get("job_id"), e)
+    # The job will not run again, so its claim-checked data can go; shards share their
+    # parent's data, which the scheduler deletes once every shard has reported
+    if not job.get("payload", {}).get("shard"):
+        discard_data(job)
+
+def on_job_failed(job_type: str, job: dict, error: Exception):
+    telemetry.logger.error("%s job %s failed: %s", job_type, job.get("job_id", "unknown"), error)
+    job_errors.labels(worker_type=job_type).inc()
+    status_emitter.emit(job.get("job_id"), FAILED, worker=WORKER_NAME, error=str(error)[:500])
+
+def on_job_retry(lane: Lane, job: dict, error: Exception, outcome: str):
+    job_retries.labels(worker_type=lane.job_type, outcome=outcome).inc()
+    if outcome != RETRIED:
+        telemetry.logger.warning("Quarantined %s job %s: %s", lane.job_type, job.get("job_id", "unknown"), error)
+        status_emitter.emit(job.get("job_id"), QUARANTINED, worker=WORKER_NAME, target=lane.queue_name,
+                            error=str(error)[:500])
+
+def on_job_duplicate(job_type: str, job: dict):
+    telemetry.job(job.get("job_id"), "Skipping duplicate of completed job %s", job.get("job_id"))
+    job_duplicates.labels(worker_type=job_type).inc()
+
+def create_dispatcher(lanes: list, concurrency: int) -> ConcurrentDispatcher:
+    """Dispatcher wired to this module's callbacks; ``broker`` and ``status_emitter`` must be set"""
+    return ConcurrentDispatcher(
+        broker,
+        lanes,
+        on_job_done,
+        on_job_failed,
+        concurrency=concurrency,
+        lock_renew_sec=LOCK_RENEW_INTERVAL,
+        max_lane_wait=LANE_MAX_WAIT,
+        on_received=on_job_received,
+        dedup=create_dedup_store(),
+        on_duplicate=on_job_duplicate,
+        on_timed=on_job_timed,
+        on_retry=on_job_retry
+    )
+
+def main(queues: str = "actor", metrics_port: int = 8002, concurrency: int = 8):
+    global broker, status_emitter, telemetry
+    lanes = parse_queues(WORKER_QUEUES or queues)
+    port = int(METRICS_PORT or metrics_port)
+    concurrency = int(WORKER_CONCURRENCY or concurrency)
+    tag = "+".join(dict.fromkeys(lane.job_type.upper() for lane in lanes))
+    print(f"[{tag}] Starting worker...", flush=True)
+    telemetry = Telemetry(tag)
+
+    # Start Prometheus metrics server
+    start_metrics_server(tag, port)
+
+    # Prefetch matches the in-flight window so a refill never waits on the network
+    broker = connect_with_retry(tag, prefetch=concurrency)
+    status_emitter = StatusEmitter(broker)
+    dispatcher = create_dispatcher(lanes, concurrency)
+
+    listening = ", ".join(f"{lane.queue_name} (weight {lane.weight}, {lane.mode})" for lane in lanes)
+    print(f"[{tag}] Worker listening on {listening}, {concurrency} concurrent jobs...", flush=True)
+    try:
+        dispatcher.run()
+    except KeyboardInterrupt:
+        print(f"[{tag}] Shutting down gracefully...", flush=True)
+        dispatcher.shutdown()
+        status_emitter.close()
+        broker.close()
+        telemetry.close()
+
+if __name__ == "__main__":
+    main()